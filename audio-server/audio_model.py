@@ -1,26 +1,66 @@
 import os
 import io
+import sys
+import argparse
 import tempfile
 import traceback
 import subprocess
 import datetime
+import json
+import time
+import hashlib
+import shutil
+import queue
+import tarfile
+import threading
+import zipfile
+import itertools
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cpu_budget
+# Must run before numpy, TensorFlow and librosa size their thread pools
+cpu_budget.apply_env('inference')
+
 from werkzeug.utils import secure_filename
 import numpy as np
 import tensorflow as tf
-import tensorflow_hub as hub
 import librosa
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Dropout, Input, BatchNormalization
+import soundfile as sf
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 from sklearn.utils.class_weight import compute_class_weight
 import joblib
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-from pymongo import MongoClient
-import gridfs
-from bson import ObjectId
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from bson import Binary, ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from blob_store import (
+    BlobNotFound, GridFSBlobStore, LocalBlobStore, benchmark as benchmark_blob_store,
+    open_blob_store
+)
+from workers import (
+    DEFAULT_HEAD_CONFIG, SAMPLE_RATE, available_cores, decode_file, embed_batch, embed_clip,
+    fit_waveform, get_yamnet, run_cross_validation, run_search, search_configs, share_matrix,
+    share_rows, start_decoder_pool, start_embedder_pool, train_final, validate_waveform
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; the snapshot falls back to in-process locking
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Columnar export is optional
+    pa = pq = None
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -30,41 +70,114 @@ CORS(app, resources={
             "http://localhost:5173",
             "https://intellitrain-mern-1.onrender.com"
         ],
-        "methods": ["GET", "POST", "DELETE"],
-        "allow_headers": ["Content-Type"]
+        "methods": ["GET", "POST", "PATCH", "DELETE"],
+        "allow_headers": ["Content-Type", "X-Project-Id", "X-Sample-Rate", "X-Audio-Dtype",
+                          "X-Audio-Class", "X-Filename", "If-None-Match"],
+        "expose_headers": ["ETag"]
     }
 })
+sock = Sock(app)
+
 # Configure TensorFlow logging
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 tf.get_logger().setLevel('ERROR')
 
+# Size TF/BLAS/numba pools for serving before TensorFlow runs its first op
+cpu_budget.apply_runtime('inference')
+
 # Database Setup
-client = MongoClient('mongodb://localhost:27017/')
-db = client['audio_classification_db']
+client = MongoClient(os.environ.get('AUDIO_MONGO_URI', 'mongodb://localhost:27017/'))
+db = client[os.environ.get('AUDIO_MONGO_DB', 'audio_classification_db')]
 print(f"Connected to MongoDB database: {db.name}")  # Add verification
-fs = gridfs.GridFS(db)
 audio_collection = db['audio_samples']
 model_collection = db['models']
 classes_collection = db['audio_classes']
+tombstones_collection = db['sample_tombstones']
+embedding_cache_collection = db['embedding_cache']
+model_pointers_collection = db['model_pointers']
+migrations_collection = db['schema_migrations']
+gc_state_collection = db['gc_state']
+class_stats_collection = db['class_stats']
+cache_versions_collection = db['cache_versions']
+
+# Sample audio goes to GridFS by default, or to a content-addressed
+# directory with AUDIO_BLOB_STORE=local; blobs already in GridFS stay readable
+BLOB_STORE = os.environ.get('AUDIO_BLOB_STORE', 'gridfs').lower()
+BLOB_DIR = os.environ.get(
+    'AUDIO_BLOB_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'blobs')
+)
+blob_store = open_blob_store(db, BLOB_STORE, BLOB_DIR)
 
-# Initialize YAMNet
-yamnet = hub.load("https://tfhub.dev/google/yamnet/1")
+# Local embedding snapshot
+EMBEDDING_DIM = 1024
+SNAPSHOT_DIR = os.environ.get(
+    'AUDIO_SNAPSHOT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshot')
+)
+SNAPSHOT_SYNC_LAG = datetime.timedelta(seconds=30)
+SNAPSHOT_FORMAT = 2
+TOMBSTONE_RETENTION = datetime.timedelta(days=30)
 
-# Database Initialization
-def initialize_database():
-    """Initialize database collections and indexes"""
+# Embedding cache; bump EMBEDDING_VERSION when the model or windowing changes
+EMBEDDING_VERSION = 'yamnet-1:1s'
+EMBEDDING_CACHE_BYTES = int(os.environ.get('AUDIO_EMBEDDING_CACHE_BYTES', 64 * 1024 * 1024))
+EMBEDDING_CACHE_RETENTION = datetime.timedelta(days=90)
+
+# Training options
+SEARCH_TIME_BUDGET = float(os.environ.get('AUDIO_SEARCH_TIME_BUDGET', 300))
+CV_FOLDS = int(os.environ.get('AUDIO_CV_FOLDS', 5))
+
+# Projects
+# Each user or project is a tenant with its own models; the Node backend
+# passes it as X-Project-Id
+DEFAULT_PROJECT = 'default'
+
+def request_project():
+    """Project the current request is scoped to"""
+    json_body = request.get_json(silent=True) if request.is_json else None
+    project = (
+        request.headers.get('X-Project-Id')
+        or request.args.get('project')
+        or request.form.get('project')
+        or (json_body or {}).get('project')
+    )
+    return str(project) if project else DEFAULT_PROJECT
+
+def project_filter(project):
+    """Mongo filter for a project's documents (migration 1 backfills legacy ones)"""
+    return {'project': project}
+
+# Schema Migrations
+# Each migration is idempotent and applied once, in order, by whichever
+# process claims it first (gunicorn workers, the dev server or the CLI)
+MIGRATE_ON_STARTUP = os.environ.get('AUDIO_MIGRATE_ON_STARTUP', 'true').lower() == 'true'
+MIGRATION_LOCK_TIMEOUT = datetime.timedelta(minutes=10)
+
+def _migrate_project_scoping():
+    """Create collections, backfill projects and make class names unique per project"""
     if 'audio_classes' not in db.list_collection_names():
         db.create_collection('audio_classes')
-    
+
+    # Documents from before project scoping belong to the default project
+    for collection in (classes_collection, audio_collection, model_collection,
+                       tombstones_collection):
+        collection.update_many(
+            {'project': {'$exists': False}},
+            {'$set': {'project': DEFAULT_PROJECT}}
+        )
+
+    # Class names are unique per project rather than globally
     existing_indexes = db.audio_classes.index_information()
-    if 'name_1' not in existing_indexes:
+    if 'name_1' in existing_indexes:
+        db.audio_classes.drop_index('name_1')
+    if 'project_1_name_1' not in existing_indexes:
         try:
-            db.audio_classes.create_index('name', unique=True)
+            db.audio_classes.create_index([('project', 1), ('name', 1)], unique=True)
         except Exception as e:
             if 'duplicate key' in str(e).lower():
                 pipeline = [
                     {"$group": {
-                        "_id": "$name",
+                        "_id": {"project": "$project", "name": "$name"},
                         "dups": {"$push": "$_id"},
                         "count": {"$sum": 1}
                     }},
@@ -73,12 +186,159 @@ def initialize_database():
                 for doc in db.audio_classes.aggregate(pipeline):
                     db.audio_classes.delete_many({
                         "_id": {"$in": doc["dups"][1:]},
-                        "name": doc["_id"]
+                        "project": doc["_id"]["project"],
+                        "name": doc["_id"]["name"]
                     })
-                db.audio_classes.create_index('name', unique=True)
+                db.audio_classes.create_index([('project', 1), ('name', 1)], unique=True)
+
+def _migrate_hot_path_indexes():
+    """Indexes behind every per-request query; project leads each one"""
+    if 'class_1' in audio_collection.index_information():
+        audio_collection.drop_index('class_1')
+    audio_collection.create_index([('project', 1), ('class', 1)])
+    audio_collection.create_index([('project', 1), ('timestamp', 1)])
+    audio_collection.create_index([('project', 1), ('_id', 1)])
+    audio_collection.create_index([('project', 1), ('content_hash', 1)])
+    model_collection.create_index([('project', 1), ('timestamp', -1)])
+    tombstones_collection.create_index([('project', 1), ('_id', 1)])
+
+def _migrate_ttl_indexes():
+    """Expire tombstones and persisted embeddings"""
+    tombstones_collection.create_index(
+        'deleted_at', expireAfterSeconds=int(TOMBSTONE_RETENTION.total_seconds())
+    )
+    embedding_cache_collection.create_index(
+        'created_at', expireAfterSeconds=int(EMBEDDING_CACHE_RETENTION.total_seconds())
+    )
+
+def _migrate_sample_status():
+    """Mark existing samples ready so the snapshot can sync by ready_at"""
+    audio_collection.update_many(
+        {'status': {'$exists': False}, 'embedding': {'$exists': True}},
+        [{'$set': {'status': 'ready', 'ready_at': '$timestamp'}}]
+    )
+    audio_collection.create_index([('project', 1), ('ready_at', 1)])
+    audio_collection.create_index('status', partialFilterExpression={
+        'status': {'$in': ['pending', 'processing']}
+    })
+
+def _migrate_blob_indexes():
+    """Look up samples by blob id when releasing shared blobs"""
+    audio_collection.create_index('file_id')
+    audio_collection.create_index('playback_file_id', sparse=True)
+
+def _migrate_class_page_index():
+    """Page through a class in _id order; the old (project, class) index is its prefix"""
+    audio_collection.create_index([('project', 1), ('class', 1), ('_id', 1)])
+    if 'project_1_class_1' in audio_collection.index_information():
+        audio_collection.drop_index('project_1_class_1')
+
+def _migrate_class_stats():
+    """One class_stats document per (project, class), filled from existing samples"""
+    class_stats_collection.create_index([('project', 1), ('class', 1)], unique=True)
+    rebuild_class_stats()
+
+MIGRATIONS = [
+    (1, 'project scoping and per-project class names', _migrate_project_scoping),
+    (2, 'hot path indexes', _migrate_hot_path_indexes),
+    (3, 'ttl indexes', _migrate_ttl_indexes),
+    (4, 'sample ingest status', _migrate_sample_status),
+    (5, 'blob id indexes', _migrate_blob_indexes),
+    (6, 'class page index', _migrate_class_page_index),
+    (7, 'class statistics', _migrate_class_stats),
+]
+
+def _claim_migration(version, name):
+    """Claim a migration for this process; returns False once it is applied elsewhere"""
+    now = datetime.datetime.now()
+    while True:
+        try:
+            migrations_collection.insert_one({
+                '_id': version, 'name': name, 'status': 'running', 'started_at': now
+            })
+            return True
+        except DuplicateKeyError:
+            pass
+
+        doc = migrations_collection.find_one({'_id': version})
+        if doc is None:
+            continue
+        if doc['status'] == 'applied':
+            return False
+        # Take over a claim left behind by a process that died mid-migration
+        if datetime.datetime.now() - doc['started_at'] > MIGRATION_LOCK_TIMEOUT:
+            result = migrations_collection.update_one(
+                {'_id': version, 'status': 'running', 'started_at': doc['started_at']},
+                {'$set': {'started_at': datetime.datetime.now()}}
+            )
+            if result.modified_count:
+                return True
+        time.sleep(0.5)
+
+def run_migrations():
+    """Apply pending migrations in order; returns the versions applied here"""
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        if not _claim_migration(version, name):
+            continue
+        try:
+            migrate()
+        except Exception:
+            migrations_collection.delete_one({'_id': version, 'status': 'running'})
+            raise
+        migrations_collection.update_one(
+            {'_id': version},
+            {'$set': {'status': 'applied', 'applied_at': datetime.datetime.now()}}
+        )
+        print(f"Applied migration {version}: {name}")
+        applied.append(version)
+    return applied
 
-    classes_collection.create_index('name', unique=True)
-    audio_collection.create_index('class')
+def _plan_stages(plan):
+    """Every stage name in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+def hot_query_plans(project=DEFAULT_PROJECT):
+    """explain() the per-request queries and flag collection scans or in-memory sorts"""
+    since = ObjectId.from_datetime(datetime.datetime.now() - SNAPSHOT_SYNC_LAG)
+    queries = {
+        'active model': model_collection.find(
+            project_filter(project), {'_id': 1}).sort('timestamp', -1).limit(1),
+        'samples by class': audio_collection.find({**project_filter(project), 'class': ''}),
+        'sample page': audio_collection.find(
+            {**project_filter(project), '_id': {'$gt': ObjectId('0' * 24)}}).sort('_id', 1).limit(50),
+        'sample page by class': audio_collection.find(
+            {**project_filter(project), 'class': '', '_id': {'$gt': ObjectId('0' * 24)}}
+        ).sort('_id', 1).limit(50),
+        'samples by hash': audio_collection.find(
+            {**project_filter(project), 'content_hash': ''}),
+        'samples by timestamp': audio_collection.find(
+            project_filter(project)).sort('timestamp', 1).limit(1),
+        'snapshot sync': audio_collection.find(
+            {**project_filter(project), 'ready_at': {'$gte': since.generation_time}}
+        ).sort('ready_at', 1),
+        'tombstone sync': tombstones_collection.find(
+            {**project_filter(project), '_id': {'$gte': since}}).sort('_id', 1),
+        'class by name': classes_collection.find({**project_filter(project), 'name': ''}),
+        'class stats': class_stats_collection.find(project_filter(project)),
+    }
+    report = {}
+    for name, cursor in queries.items():
+        stages = _plan_stages(cursor.explain()['queryPlanner']['winningPlan'])
+        report[name] = {
+            'stages': stages,
+            'covered': 'COLLSCAN' not in stages and 'SORT' not in stages
+        }
+    return report
 
 # Audio Processing Functions
 # audio_model.py - Updated validate_audio function
@@ -86,45 +346,588 @@ def validate_audio(audio_bytes):
     """Validate audio quality and format using in-memory processing"""
     try:
         # Use BytesIO directly
-        y, sr = librosa.load(io.BytesIO(audio_bytes), sr=16000, duration=1.5)
-        
-        if len(y) < sr * 0.5:
-            return False, "Audio too short (minimum 0.5 second)"
-            
-        rms = librosa.feature.rms(y=y)
-        if np.mean(rms) < 0.005:
-            return False, "Audio too quiet"
-            
-        return True, ""
+        y, sr = librosa.load(io.BytesIO(audio_bytes), sr=SAMPLE_RATE, duration=1.5)
+        return validate_waveform(y, sr)
     except Exception as e:
         return False, f"Invalid audio: {str(e)}"
 
-def extract_embedding(audio_data, sr=16000):
-    """Extract audio features using YAMNet"""
+PCM_DTYPES = ('float32', 'int16')
+
+def decode_pcm(buffer, dtype='float32'):
+    """View little-endian mono PCM as float32 samples; float32 input is not copied"""
+    if dtype == 'int16':
+        return np.frombuffer(buffer, dtype='<i2').astype(np.float32) / 32768.0
+    return np.frombuffer(buffer, dtype='<f4')
+
+def encode_wav(y, sr=SAMPLE_RATE):
+    """16-bit mono WAV bytes, used to store raw PCM uploads"""
+    buffer = io.BytesIO()
+    sf.write(buffer, y, sr, format='WAV', subtype='PCM_16')
+    return buffer.getvalue()
+
+def embed_waveform(y):
+    """Mean YAMNet embedding of a one-second waveform"""
+    _, embeddings, _ = get_yamnet()(tf.convert_to_tensor(y, dtype=tf.float32))
+    return np.mean(embeddings, axis=0)
+
+# Caches
+class LRUCache:
+    """Thread-safe LRU bounded by entry count, total bytes and/or TTL"""
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 0)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry[2] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = (value, size, time.monotonic())
+            self.bytes += size
+            while self._data and (
+                (self.max_entries is not None and len(self._data) > self.max_entries)
+                or (self.max_bytes is not None and self.bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def discard_where(self, predicate):
+        """Drop every entry whose key matches predicate"""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+class EmbeddingCache:
+    """In-memory LRU in front of the persistent ``embedding_cache`` collection.
+
+    Keys are the SHA-256 of the audio bytes plus EMBEDDING_VERSION, so any
+    path that embeds the same upload again skips YAMNet.
+    """
+
+    def __init__(self, max_bytes):
+        self.memory = LRUCache(max_bytes=max_bytes, sizeof=lambda value: value.nbytes + 100)
+        self.store_hits = 0
+        self.store_misses = 0
+
+    @staticmethod
+    def key(digest):
+        return f"{digest}:{EMBEDDING_VERSION}"
+
+    def get(self, digest):
+        key = self.key(digest)
+        embedding = self.memory.get(key)
+        if embedding is not None:
+            return embedding
+        try:
+            doc = embedding_cache_collection.find_one({'_id': key})
+        except Exception as e:
+            print(f"Embedding cache read failed: {e}")
+            return None
+        if doc is None:
+            self.store_misses += 1
+            return None
+        self.store_hits += 1
+        embedding = np.frombuffer(doc['embedding'], dtype=np.float32)
+        self.memory.put(key, embedding)
+        return embedding
+
+    def put(self, digest, embedding):
+        key = self.key(digest)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self.memory.put(key, embedding)
+        try:
+            embedding_cache_collection.update_one(
+                {'_id': key},
+                {'$setOnInsert': {
+                    'embedding': Binary(embedding.tobytes()),
+                    'created_at': datetime.datetime.now()
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"Embedding cache write failed: {e}")
+
+    def stats(self):
+        return dict(self.memory.stats(), store_hits=self.store_hits,
+                    store_misses=self.store_misses)
+
+
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_BYTES)
+
+def embed_decoded(digest, y):
+    """Embedding of an already-decoded 16 kHz waveform, through the cache"""
+    embedding = embedding_cache.get(digest)
+    if embedding is None:
+        embedding = embed_waveform(fit_waveform(y))
+        embedding_cache.put(digest, embedding)
+    return embedding
+
+def extract_embedding(audio_data, sr=SAMPLE_RATE):
+    """Extract audio features using YAMNet, reusing cached embeddings"""
+    digest = hashlib.sha256(audio_data).hexdigest() if sr == SAMPLE_RATE else None
+    if digest:
+        cached = embedding_cache.get(digest)
+        if cached is not None:
+            return cached
+
     try:
         y, sr = librosa.load(io.BytesIO(audio_data), sr=sr, duration=1.0)
-        if len(y) < sr:
-            y = np.pad(y, (0, max(0, sr - len(y))))
-        
-        waveform = tf.convert_to_tensor(y, dtype=tf.float32)
-        _, embeddings, _ = yamnet(waveform)
-        return np.mean(embeddings, axis=0)
+        embedding = embed_waveform(fit_waveform(y, sr))
     except Exception as e:
         print(f"Error processing audio: {e}")
         return np.zeros(1024)
 
+    if digest:
+        embedding_cache.put(digest, embedding)
+    return embedding
+
+class ModelPool:
+    """Loaded models for every tenant under one memory ceiling.
+
+    Entries are evicted least-recently-used first once their estimated
+    weight size exceeds ``max_bytes``. Concurrent misses for the same model
+    share a single load.
+    """
+
+    def __init__(self, max_bytes, sizeof):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._recently_evicted = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.reloads = 0
+
+    def get(self, key, loader):
+        """Cached value for key, calling loader() once on a miss; None results aren't kept"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry['value']
+            flight = self._loading.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._loading[key] = {
+                    'event': threading.Event(), 'value': None, 'error': None
+                }
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight['event'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return flight['value']
+
+        try:
+            started = time.monotonic()
+            value = loader()
+            flight['value'] = value
+            if value is not None:
+                self._insert(key, value, time.monotonic() - started)
+            return value
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._loading[key]
+            flight['event'].set()
+
+    def _insert(self, key, value, seconds):
+        size = self.sizeof(value)
+        with self._lock:
+            self.loads += 1
+            self.load_seconds += seconds
+            if self._recently_evicted.pop(key, None) is not None:
+                self.reloads += 1
+            self._entries[key] = {'value': value, 'bytes': size}
+            self.bytes += size
+            # Never evict the entry that was just loaded
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted['bytes']
+                self.evictions += 1
+                self.evicted_bytes += evicted['bytes']
+                self._recently_evicted[evicted_key] = True
+                if len(self._recently_evicted) > 1024:
+                    self._recently_evicted.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry['bytes']
+
+    def discard_where(self, predicate):
+        """Drop every loaded value matching predicate; returns how many were dropped"""
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if predicate(entry['value'])]
+            for key in keys:
+                self.bytes -= self._entries.pop(key)['bytes']
+            return len(keys)
+
+    def stats(self, tenant_of=None):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            stats = {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'occupancy': self.bytes / self.max_bytes if self.max_bytes else 0.0,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced_loads': self.coalesced,
+                'loads': self.loads,
+                'avg_load_seconds': self.load_seconds / self.loads if self.loads else 0.0,
+                'evictions': self.evictions,
+                'evicted_bytes': self.evicted_bytes,
+                'reloads_after_eviction': self.reloads,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+            if tenant_of is not None:
+                tenants = {}
+                for entry in self._entries.values():
+                    tenant = tenant_of(entry['value'])
+                    tenants[tenant] = tenants.get(tenant, 0) + entry['bytes']
+                stats['tenant_bytes'] = tenants
+            return stats
+
+# Embedding Snapshot
+class EmbeddingSnapshot:
+    """Local memory-mapped copy of one project's sample embeddings, labels and ids.
+
+    Ready rows are appended incrementally from ``audio_samples`` using a
+    ``ready_at`` high-water mark and marked dead from ``sample_tombstones``. Readers get a
+    zero-copy ``np.memmap`` view instead of scanning the collection.
+    """
+
+    def __init__(self, path, project):
+        self.path = path
+        self.project = project
+        self._thread_lock = threading.Lock()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _flock(self, exclusive):
+        os.makedirs(self.path, exist_ok=True)
+        handle = open(self._file('.lock'), 'a')
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        return handle
+
+    def _read_state(self):
+        try:
+            with open(self._file('state.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'format': SNAPSHOT_FORMAT, 'rows': 0, 'capacity': 0, 'high_water': None,
+                    'tombstone_high_water': None, 'synced_at': None}
+
+    def _write_state(self, state):
+        self._atomic_write('state.json', lambda f: f.write(json.dumps(state).encode()))
+
+    def _atomic_write(self, name, writer):
+        tmp_path = self._file(name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            writer(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._file(name))
+
+    def _save_array(self, name, array):
+        self._atomic_write(name, lambda f: np.save(f, array))
+
+    def _load_array(self, name, rows, dtype):
+        try:
+            return np.load(self._file(name), mmap_mode='r')[:rows]
+        except OSError:
+            return np.zeros(0, dtype=dtype)
+
+    def _open_embeddings(self, mode, rows, capacity):
+        if capacity == 0:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        matrix = np.load(self._file('embeddings.npy'), mmap_mode=mode)
+        return matrix if mode == 'r+' else matrix[:rows]
+
+    def _grow(self, state, needed):
+        """Reallocate embeddings.npy with doubled capacity, keeping existing rows"""
+        capacity = max(1024, state['capacity'])
+        while capacity < needed:
+            capacity *= 2
+        tmp_path = self._file('embeddings.npy.tmp')
+        grown = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype=np.float32, shape=(capacity, EMBEDDING_DIM)
+        )
+        if state['rows']:
+            grown[:state['rows']] = self._open_embeddings('r', state['rows'], state['capacity'])
+        grown.flush()
+        del grown
+        os.replace(tmp_path, self._file('embeddings.npy'))
+        state['capacity'] = capacity
+
+    def sync(self):
+        """Pull new samples and tombstones since the last high-water mark"""
+        with self._thread_lock, self._flock(exclusive=True):
+            state = self._read_state()
+            if state.get('format') != SNAPSHOT_FORMAT:
+                self._clear()
+                state = self._read_state()
+            if state['synced_at'] and (
+                datetime.datetime.now() - datetime.datetime.fromisoformat(state['synced_at'])
+                > TOMBSTONE_RETENTION
+            ):
+                # Tombstones older than this have expired, so deletions may be missed
+                self._clear()
+                state = self._read_state()
+
+            rows = state['rows']
+            ids = list(self._load_array('ids.npy', rows, '<U24'))
+            labels = list(self._load_array('labels.npy', rows, '<U1'))
+            alive = np.array(self._load_array('alive.npy', rows, bool), dtype=bool)
+            known = set(ids)
+
+            # Samples enter in ready_at order (async ingest finishes out of _id order);
+            # writers may also commit slightly out of order, so re-read a lag window
+            since = datetime.datetime(1970, 1, 1)
+            if state['high_water']:
+                since = datetime.datetime.fromisoformat(state['high_water']) - SNAPSHOT_SYNC_LAG
+            query = {**project_filter(self.project), 'ready_at': {'$gte': since}}
+
+            new_ids, new_labels, new_rows = [], [], []
+            cursor = audio_collection.find(
+                query, {'embedding': 1, 'class': 1, 'ready_at': 1}
+            ).sort('ready_at', 1)
+            for doc in cursor:
+                doc_id = str(doc['_id'])
+                state['high_water'] = doc['ready_at'].isoformat()
+                if doc_id in known or len(doc.get('embedding') or []) != EMBEDDING_DIM:
+                    continue
+                known.add(doc_id)
+                new_ids.append(doc_id)
+                new_labels.append(doc['class'])
+                new_rows.append(np.asarray(doc['embedding'], dtype=np.float32))
+
+            if new_rows:
+                if rows + len(new_rows) > state['capacity']:
+                    self._grow(state, rows + len(new_rows))
+                matrix = self._open_embeddings('r+', rows, state['capacity'])
+                matrix[rows:rows + len(new_rows)] = np.stack(new_rows)
+                matrix.flush()
+                del matrix
+                ids.extend(new_ids)
+                labels.extend(new_labels)
+                alive = np.concatenate([alive, np.ones(len(new_rows), dtype=bool)])
+                rows += len(new_rows)
+
+            tombstone_query = project_filter(self.project)
+            if state['tombstone_high_water']:
+                since = (ObjectId(state['tombstone_high_water']).generation_time
+                         - SNAPSHOT_SYNC_LAG)
+                tombstone_query['_id'] = {'$gte': ObjectId.from_datetime(since)}
+            deleted = set()
+            for tombstone in tombstones_collection.find(tombstone_query).sort('_id', 1):
+                state['tombstone_high_water'] = str(tombstone['_id'])
+                deleted.add(str(tombstone['sample_id']))
+            if deleted:
+                for index, sample_id in enumerate(ids):
+                    if sample_id in deleted:
+                        alive[index] = False
+
+            self._save_array('ids.npy', np.array(ids, dtype='<U24'))
+            self._save_array('labels.npy', np.array(labels, dtype=str))
+            self._save_array('alive.npy', alive)
+            state['rows'] = rows
+            state['synced_at'] = datetime.datetime.now().isoformat()
+            self._write_state(state)
+
+            if rows and (~alive).sum() > rows // 4:
+                self._compact(state)
+            return {'rows': state['rows'], 'added': len(new_rows), 'deleted': len(deleted)}
+
+    def _compact(self, state):
+        """Rewrite the snapshot without tombstoned rows (caller holds the lock)"""
+        rows = state['rows']
+        alive = np.array(self._load_array('alive.npy', rows, bool), dtype=bool)
+        ids = self._load_array('ids.npy', rows, '<U24')[alive]
+        labels = self._load_array('labels.npy', rows, '<U1')[alive]
+        live = self._open_embeddings('r', rows, state['capacity'])[alive]
+
+        state['rows'] = state['capacity'] = 0
+        if len(live):
+            self._grow(state, len(live))
+            matrix = self._open_embeddings('r+', 0, state['capacity'])
+            matrix[:len(live)] = live
+            matrix.flush()
+            del matrix
+        self._save_array('ids.npy', np.array(ids, dtype='<U24'))
+        self._save_array('labels.npy', np.array(labels, dtype=str))
+        self._save_array('alive.npy', np.ones(len(live), dtype=bool))
+        state['rows'] = len(live)
+        self._write_state(state)
+
+    def _clear(self):
+        """Drop local files so the next sync starts from scratch (caller holds the lock)"""
+        for name in ('state.json', 'embeddings.npy', 'ids.npy', 'labels.npy', 'alive.npy'):
+            try:
+                os.unlink(self._file(name))
+            except FileNotFoundError:
+                pass
+
+    def reset(self):
+        """Discard the snapshot; the next sync rebuilds it from Mongo"""
+        with self._thread_lock, self._flock(exclusive=True):
+            self._clear()
+
+    def link(self, workdir):
+        """Hard-link embeddings.npy into workdir; returns (path, live rows, labels, ids).
+
+        The link pins the current file without copying it: sync only writes
+        past the rows returned here, and growing or compacting replaces the
+        file rather than rewriting it. Falls back to copying the live rows
+        where hard links are unavailable.
+        """
+        path = os.path.join(workdir, 'X.npy')
+        with self._flock(exclusive=False):
+            state = self._read_state()
+            rows = state['rows']
+            labels = self._load_array('labels.npy', rows, '<U1')
+            ids = self._load_array('ids.npy', rows, '<U24')
+            live = np.flatnonzero(self._load_array('alive.npy', rows, bool))
+            if state['capacity']:
+                try:
+                    os.link(self._file('embeddings.npy'), path)
+                    return path, live, labels[live], ids[live]
+                except OSError:
+                    pass
+            X = self._open_embeddings('r', rows, state['capacity'])
+            np.save(path, np.ascontiguousarray(X[live], dtype=np.float32))
+        return path, np.arange(len(live)), labels[live], ids[live]
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+def get_snapshot(project):
+    """The project's snapshot, stored in its own directory under SNAPSHOT_DIR"""
+    with _snapshots_lock:
+        snapshot = _snapshots.get(project)
+        if snapshot is None:
+            digest = hashlib.sha1(project.encode()).hexdigest()[:8]
+            path = os.path.join(SNAPSHOT_DIR, f"{secure_filename(project)}-{digest}")
+            snapshot = _snapshots[project] = EmbeddingSnapshot(path, project)
+        return snapshot
+
+# Class List Cache
+# Every process keeps each project's class list alongside the version it was
+# read at. Writers bump a per-project counter in cache_versions after
+# changing audio_classes, so a GET costs one _id lookup until the list
+# changes in any worker; the version also serves as the ETag.
+CLASS_CACHE_ENTRIES = int(os.environ.get('AUDIO_CLASS_CACHE_ENTRIES', 1000))
+
+class_list_cache = LRUCache(max_entries=CLASS_CACHE_ENTRIES)
+
+def _classes_version_id(project):
+    return f"classes:{project}"
+
+def classes_version(project):
+    """ETag for the project's class list; the epoch changes if the counter is recreated"""
+    doc = cache_versions_collection.find_one({'_id': _classes_version_id(project)})
+    if doc is None:
+        return f"{hashlib.sha1(project.encode()).hexdigest()[:8]}-0"
+    return f"{doc['epoch']}-{doc['version']}"
+
+def bump_classes_version(project):
+    """Invalidate every process's cached class list for a project"""
+    cache_versions_collection.update_one(
+        {'_id': _classes_version_id(project)},
+        {'$inc': {'version': 1}, '$setOnInsert': {'epoch': str(ObjectId())}},
+        upsert=True
+    )
+
+def list_classes(project):
+    """(version, classes) for a project, served from class_list_cache while current"""
+    version = classes_version(project)
+    cached = class_list_cache.get(project)
+    if cached is not None and cached[0] == version:
+        return cached
+    # Read after the version: a concurrent change bumps it again and the next call reloads
+    classes = [{'_id': str(cls['_id']), 'name': cls['name']} for cls in
+               classes_collection.find(project_filter(project), {'_id': 1, 'name': 1})]
+    class_list_cache.put(project, (version, classes))
+    return version, classes
+
 # API Endpoints
 @app.route('/api/audio/classes/initialize-defaults', methods=['POST'])
 def initialize_default_classes():
     """Initialize default classes if they don't exist"""
     try:
+        project = request_project()
         default_classes = ['Class 1', 'Class 2']
         initialized_classes = []
         
         for class_name in default_classes:
-            if not classes_collection.find_one({'name': class_name}):
+            if not classes_collection.find_one({'name': class_name, **project_filter(project)}):
                 result = classes_collection.insert_one({
                     'name': class_name,
+                    'project': project,
                     'created_at': datetime.datetime.now(),
                     'is_default': True
                 })
@@ -132,6 +935,8 @@ def initialize_default_classes():
                     '_id': str(result.inserted_id),
                     'name': class_name
                 })
+        if initialized_classes:
+            bump_classes_version(project)
         
         return jsonify({
             'status': 'success',
@@ -142,14 +947,23 @@ def initialize_default_classes():
 
 @app.route('/api/audio/classes', methods=['GET', 'POST'])
 def handle_classes():
-    """Handle class creation and listing"""
+    """Handle class creation and listing for the request's project
+
+    Listings carry an ETag; a matching If-None-Match gets a 304.
+    """
+    project = request_project()
     if request.method == 'GET':
         try:
-            classes = list(classes_collection.find({}, {'_id': 1, 'name': 1}))
-            return jsonify([{
-                '_id': str(cls['_id']),
-                'name': cls['name']
-            } for cls in classes]), 200
+            version, classes = list_classes(project)
+            if request.if_none_match.contains(version):
+                response = Response(status=304)
+            else:
+                response = jsonify(classes)
+            response.set_etag(version)
+            # Revalidate every time; the project comes from a header, not the URL
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('X-Project-Id')
+            return response
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -159,13 +973,15 @@ def handle_classes():
             if not class_name:
                 return jsonify({'error': 'Class name required'}), 400
             
-            if classes_collection.find_one({'name': class_name}):
+            if classes_collection.find_one({'name': class_name, **project_filter(project)}):
                 return jsonify({'error': 'Class already exists'}), 400
             
             result = classes_collection.insert_one({
                 'name': class_name,
+                'project': project,
                 'created_at': datetime.datetime.now()
             })
+            bump_classes_version(project)
             
             return jsonify({
                 '_id': str(result.inserted_id),
@@ -174,256 +990,2620 @@ def handle_classes():
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+CLASS_DELETE_BATCH = 1000
+
+def invalidate_project_models(project):
+    """Drop a project's loaded models and cached predictions after its class set changes
+
+    Models that still predict a deleted or renamed class are refused by
+    the prediction endpoints until the project is retrained.
+    """
+    model_pool.discard_where(lambda loaded: loaded[2] == project)
+    prediction_cache.discard_where(lambda key: key[0] == project)
+
+def delete_class_samples(project, class_name):
+    """Cascade-delete a class's samples in batches; returns how many were removed"""
+    deleted = 0
+    while True:
+        batch = list(audio_collection.find(
+            {'project': project, 'class': class_name},
+            {'_id': 1, 'file_id': 1, 'playback_file_id': 1}
+        ).limit(CLASS_DELETE_BATCH))
+        if not batch:
+            class_stats_collection.delete_one({'project': project, 'class': class_name})
+            return deleted
+
+        # Documents first, as in delete_sample, so a failure leaves orphans for GC
+        sample_ids = [doc['_id'] for doc in batch]
+        audio_collection.delete_many({'_id': {'$in': sample_ids}})
+        now = datetime.datetime.now()
+        tombstones_collection.insert_many([
+            {'sample_id': sample_id, 'project': project, 'deleted_at': now}
+            for sample_id in sample_ids
+        ])
+        release_blobs([doc[field] for doc in batch
+                       for field in ('file_id', 'playback_file_id') if doc.get(field)])
+        deleted += len(sample_ids)
+
+@app.route('/api/audio/classes/<path:class_name>', methods=['PATCH', 'DELETE'])
+def manage_class(class_name):
+    """Rename a class (PATCH {"name": ..., "merge": false}) or delete it with its samples
+
+    Models trained before the change still predict the old class set, so
+    the prediction endpoints refuse them (409) until the project is
+    retrained, unless the request passes ``allow_stale=true``.
+    """
+    try:
+        project = request_project()
+        cls = classes_collection.find_one({'name': class_name, **project_filter(project)})
+        if not cls:
+            return jsonify({'error': 'Class not found'}), 404
+
+        if request.method == 'DELETE':
+            deleted = delete_class_samples(project, class_name)
+            classes_collection.delete_one({'_id': cls['_id']})
+            bump_classes_version(project)
+            invalidate_project_models(project)
+            return jsonify({'status': 'deleted', 'name': class_name,
+                            'samples_deleted': deleted}), 200
+
+        data = request.get_json(silent=True) or {}
+        new_name = data.get('name')
+        if not new_name:
+            return jsonify({'error': 'New class name required'}), 400
+        if new_name == class_name:
+            return jsonify({'name': new_name, 'samples_updated': 0, 'merged': False}), 200
+
+        target = classes_collection.find_one({'name': new_name, **project_filter(project)})
+        if target and not data.get('merge'):
+            return jsonify({'error': 'Class already exists'}), 409
+        if target:
+            classes_collection.delete_one({'_id': cls['_id']})
+        else:
+            try:
+                classes_collection.update_one({'_id': cls['_id']}, {'$set': {'name': new_name}})
+            except DuplicateKeyError:
+                return jsonify({'error': 'Class already exists'}), 409
+        bump_classes_version(project)
+
+        result = audio_collection.update_many(
+            {'project': project, 'class': class_name}, {'$set': {'class': new_name}}
+        )
+        rename_class_stats(project, class_name, new_name)
+        # Snapshot labels are only appended, so relabelled rows need a rebuild
+        get_snapshot(project).reset()
+        invalidate_project_models(project)
+        return jsonify({'name': new_name, 'samples_updated': result.modified_count,
+                        'merged': bool(target)}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Raw PCM Uploads
+# /samples and /predict also take an application/octet-stream body of mono
+# little-endian PCM, skipping multipart parsing and WAV decoding
+RAW_PCM_MIMETYPE = 'application/octet-stream'
+
+def is_raw_pcm_request():
+    return request.mimetype == RAW_PCM_MIMETYPE
+
+def read_raw_pcm():
+    """Decode a raw PCM request body; returns (waveform, error).
+
+    X-Sample-Rate (default 16000) and X-Audio-Dtype (float32 or int16)
+    describe the samples. Only bodies at another rate are resampled.
+    """
+    dtype = request.headers.get('X-Audio-Dtype', 'float32').lower()
+    if dtype not in PCM_DTYPES:
+        return None, 'X-Audio-Dtype must be float32 or int16'
+    try:
+        sr = int(request.headers.get('X-Sample-Rate', SAMPLE_RATE))
+    except ValueError:
+        return None, 'X-Sample-Rate must be an integer'
+    if sr <= 0:
+        return None, 'X-Sample-Rate must be positive'
+
+    try:
+        y = decode_pcm(request.get_data(cache=False), dtype)
+    except ValueError:
+        return None, f"Body is not a whole number of {dtype} samples"
+    if not np.all(np.isfinite(y)):
+        return None, 'PCM contains NaN or infinite samples'
+    if sr != SAMPLE_RATE:
+        y = librosa.resample(y, orig_sr=sr, target_sr=SAMPLE_RATE)
+    return y, None
+
+# Audio Storage
+# Uploads can be re-encoded before they reach GridFS: uncompressed PCM as
+# lossless FLAC, plus an optional Opus copy for playback. Decoding for
+# embeddings goes through soundfile/librosa, which read both.
+STORAGE_CODEC = os.environ.get('AUDIO_STORAGE_CODEC', 'raw').lower()      # raw | flac
+PLAYBACK_CODEC = os.environ.get('AUDIO_PLAYBACK_CODEC', 'none').lower()   # none | opus
+AUDIO_MIMETYPES = {
+    'WAV': 'audio/wav',
+    'WAVEX': 'audio/wav',
+    'FLAC': 'audio/flac',
+    'OGG': 'audio/ogg',
+    'MP3': 'audio/mpeg',
+    'AIFF': 'audio/aiff'
+}
+_UNCOMPRESSED_FORMATS = ('WAV', 'WAVEX', 'AIFF', 'W64', 'RF64')
+_OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+def _encode(data, sr, fmt, subtype):
+    buffer = io.BytesIO()
+    sf.write(buffer, data, sr, format=fmt, subtype=subtype)
+    return buffer.getvalue()
+
+def encode_for_storage(audio_bytes):
+    """Apply the storage codec; returns (stored_bytes, codec, content_type).
+
+    Only uncompressed input is converted, and only when FLAC comes out
+    smaller. 8/16-bit PCM round-trips exactly; wider or float input is
+    kept at 24 bits.
+    """
+    try:
+        info = sf.info(io.BytesIO(audio_bytes))
+    except Exception:
+        return audio_bytes, None, 'audio/wav'
+    codec, content_type = info.format.lower(), AUDIO_MIMETYPES.get(info.format, 'audio/wav')
+    if STORAGE_CODEC != 'flac' or info.format not in _UNCOMPRESSED_FORMATS:
+        return audio_bytes, codec, content_type
+
+    narrow = info.subtype in ('PCM_16', 'PCM_U8', 'PCM_S8')
+    if narrow:
+        dtype = 'int16'
+    else:
+        # libsndfile doesn't rescale float samples read as integers
+        dtype = 'float64' if info.subtype in ('FLOAT', 'DOUBLE') else 'int32'
+    try:
+        data, sr = sf.read(io.BytesIO(audio_bytes), dtype=dtype)
+        flac = _encode(data, sr, 'FLAC', 'PCM_16' if narrow else 'PCM_24')
+    except Exception as e:
+        print(f"FLAC encoding failed, storing original audio: {e}")
+        return audio_bytes, codec, content_type
+    if len(flac) >= len(audio_bytes):
+        return audio_bytes, codec, content_type
+    return flac, 'flac', 'audio/flac'
+
+def encode_playback_copy(audio_bytes):
+    """Opus-in-Ogg copy for playback, or None when disabled or not encodable"""
+    if PLAYBACK_CODEC != 'opus':
+        return None
+    try:
+        data, sr = sf.read(io.BytesIO(audio_bytes), dtype='float32')
+        if sr not in _OPUS_SAMPLE_RATES:
+            data = librosa.resample(data.T, orig_sr=sr, target_sr=48000).T
+            sr = 48000
+        return _encode(data, sr, 'OGG', 'OPUS')
+    except Exception as e:
+        print(f"Opus playback copy failed: {e}")
+        return None
+
+def store_audio(audio_bytes, filename):
+    """Encode and write an upload to the blob store; returns the sample's storage fields"""
+    data, codec, content_type = encode_for_storage(audio_bytes)
+    stored = {
+        'file_id': blob_store.put(data, filename=filename, content_type=content_type),
+        'codec': codec,
+        'content_type': content_type,
+        'size': len(data)
+    }
+    playback = encode_playback_copy(audio_bytes)
+    if playback is not None:
+        try:
+            stored['playback_file_id'] = blob_store.put(
+                playback, filename=filename, content_type='audio/ogg')
+        except Exception:
+            release_blob(stored['file_id'])
+            raise
+    return stored
+
+def _recently_put(blob_id):
+    """Whether a shared blob was written or re-put within the GC grace period.
+
+    A duplicate upload reuses the blob at put() time but only inserts its
+    sample after embedding, so a reference check alone can miss it.
+    """
+    cutoff = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - GC_GRACE
+    try:
+        return blob_store.created_at(blob_id) >= cutoff
+    except BlobNotFound:
+        return False
+
+def release_blob(blob_id, sample_id=None):
+    """Delete a blob unless another sample still references it
+
+    Recently put shared blobs are left for garbage collection, which
+    checks references again once the grace period is over.
+    """
+    if blob_store.is_shared(blob_id):
+        if _recently_put(blob_id):
+            return
+        query = {'$or': [{'file_id': blob_id}, {'playback_file_id': blob_id}]}
+        if sample_id is not None:
+            query['_id'] = {'$ne': sample_id}
+        if audio_collection.find_one(query, {'_id': 1}):
+            return
+    blob_store.delete(blob_id)
+
+def delete_audio(sample):
+    """Delete a sample's stored audio and playback copy"""
+    release_blob(sample['file_id'], sample.get('_id'))
+    if sample.get('playback_file_id'):
+        release_blob(sample['playback_file_id'], sample.get('_id'))
+
+def referenced_blobs(blob_ids):
+    """Subset of blob_ids some sample points at (covered by the blob id indexes)"""
+    referenced = set()
+    for field in ('file_id', 'playback_file_id'):
+        for doc in audio_collection.find({field: {'$in': blob_ids}}, {field: 1, '_id': 0}):
+            referenced.add(doc[field])
+    return referenced
+
+def release_blobs(blob_ids):
+    """Batched release_blob for samples whose documents are already deleted"""
+    blob_ids = list(blob_ids)
+    shared = [blob_id for blob_id in blob_ids if blob_store.is_shared(blob_id)]
+    keep = referenced_blobs(shared) if shared else set()
+    keep.update(blob_id for blob_id in shared if _recently_put(blob_id))
+    blob_store.delete_many([blob_id for blob_id in blob_ids if blob_id not in keep])
+
+# Class Statistics
+# One class_stats document per (project, class) holds the count, total
+# duration, stored bytes and embedding sum of its ready samples. Writers
+# apply deltas with $inc as samples become ready or are deleted, so
+# readiness checks and per-class counts never scan audio_samples;
+# rebuild_class_stats recomputes them if they drift.
+def sample_stats(docs):
+    """Per-(project, class) totals for ready sample documents"""
+    totals = {}
+    for doc in docs:
+        key = (doc['project'], doc['class'])
+        if key not in totals:
+            totals[key] = {'count': 0, 'duration': 0.0, 'bytes': 0,
+                           'embedding_sum': np.zeros(EMBEDDING_DIM)}
+        total = totals[key]
+        total['count'] += 1
+        total['duration'] += doc.get('duration') or 0.0
+        total['bytes'] += doc.get('size') or 0
+        if doc.get('embedding') is not None:
+            total['embedding_sum'] += np.asarray(doc['embedding'], dtype=np.float64)
+    return totals
+
+def apply_class_stats(totals, sign=1):
+    """Add (sign=1) or subtract (sign=-1) sample_stats totals with $inc"""
+    if not totals:
+        return
+    operations = []
+    for (project, class_name), total in totals.items():
+        key = {'project': project, 'class': class_name}
+        # The array has to exist before its elements can be incremented
+        operations.append(UpdateOne(key, {'$setOnInsert': {
+            **key, 'embedding_sum': [0.0] * EMBEDDING_DIM
+        }}, upsert=True))
+        increments = {
+            'count': sign * total['count'],
+            'duration': sign * total['duration'],
+            'bytes': sign * total['bytes']
+        }
+        increments.update({f"embedding_sum.{i}": sign * float(value)
+                           for i, value in enumerate(total['embedding_sum'])})
+        operations.append(UpdateOne(key, {'$inc': increments,
+                                          '$currentDate': {'updated_at': True}}))
+    class_stats_collection.bulk_write(operations, ordered=True)
+
+def update_class_stats(docs, sign=1):
+    """apply_class_stats for sample documents; failures are logged and left for a rebuild"""
+    try:
+        apply_class_stats(sample_stats(docs), sign)
+    except Exception as e:
+        print(f"Could not update class stats: {str(e)}")
+
+def rename_class_stats(project, class_name, new_name):
+    """Move a class's totals to new_name, adding them to any totals already there"""
+    stats = class_stats_collection.find_one({'project': project, 'class': class_name})
+    if stats is None:
+        return
+    total = {field: stats.get(field, 0) for field in ('count', 'duration', 'bytes')}
+    total['embedding_sum'] = np.asarray(stats.get('embedding_sum') or np.zeros(EMBEDDING_DIM))
+    apply_class_stats({(project, new_name): total})
+    class_stats_collection.delete_one({'_id': stats['_id']})
+
+def get_class_stats(project):
+    """class_stats documents for a project, keyed by class name"""
+    return {doc['class']: doc for doc in class_stats_collection.find(project_filter(project))}
+
+def _sample_size(doc):
+    """Stored size of a sample from before sizes were recorded, saved back on the sample"""
+    try:
+        size = blob_store.size(doc['file_id'])
+    except BlobNotFound:
+        return 0
+    audio_collection.update_one({'_id': doc['_id']}, {'$set': {'size': size}})
+    return size
+
+def rebuild_class_stats(project=None):
+    """Recompute class_stats from the samples; returns the number of classes written
+
+    Writes that land while a project is being rebuilt can be lost, so run
+    it while ingest is quiet.
+    """
+    query = {'status': 'ready'}
+    if project is not None:
+        query.update(project_filter(project))
+    docs = audio_collection.find(query, {'project': 1, 'class': 1, 'duration': 1,
+                                         'size': 1, 'file_id': 1, 'embedding': 1})
+    totals = sample_stats(
+        dict(doc, size=_sample_size(doc)) if doc.get('size') is None and doc.get('file_id')
+        else doc for doc in docs
+    )
+
+    now = datetime.datetime.now()
+    for (doc_project, class_name), total in totals.items():
+        class_stats_collection.replace_one(
+            {'project': doc_project, 'class': class_name},
+            {'project': doc_project, 'class': class_name, 'count': total['count'],
+             'duration': total['duration'], 'bytes': total['bytes'],
+             'embedding_sum': total['embedding_sum'].tolist(), 'updated_at': now},
+            upsert=True
+        )
+    # Classes whose samples are all gone
+    scope = project_filter(project) if project is not None else {}
+    stale = [doc['_id'] for doc in class_stats_collection.find(scope, {'project': 1, 'class': 1})
+             if (doc['project'], doc['class']) not in totals]
+    if stale:
+        class_stats_collection.delete_many({'_id': {'$in': stale}})
+    return len(totals)
+
+@app.route('/api/audio/classes/stats', methods=['GET'])
+def class_statistics():
+    """Per-class sample count, total duration and stored bytes
+
+    ``?centroids=true`` adds each class's mean embedding.
+    """
+    try:
+        centroids = request.args.get('centroids', 'false').lower() == 'true'
+        response = {}
+        for class_name, stats in get_class_stats(request_project()).items():
+            count = stats.get('count', 0)
+            response[class_name] = {
+                'count': count,
+                'duration': stats.get('duration', 0.0),
+                'bytes': stats.get('bytes', 0)
+            }
+            if centroids:
+                response[class_name]['centroid'] = (
+                    (np.asarray(stats['embedding_sum']) / count).tolist() if count > 0 else None)
+        return jsonify(response), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/audio/classes/stats/rebuild', methods=['POST'])
+def rebuild_statistics():
+    """Recompute the project's class statistics from its samples"""
+    try:
+        return jsonify({'classes': rebuild_class_stats(request_project())}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Sample Ingest
+ASYNC_INGEST = os.environ.get('AUDIO_ASYNC_INGEST', 'false').lower() == 'true'
+INGEST_WORKERS = int(os.environ.get('AUDIO_INGEST_WORKERS', 2))
+INGEST_LEASE = datetime.timedelta(minutes=5)
+MAX_STATUS_WAIT = 30
+
+# Threads only fetch blobs and write results; decoding and YAMNet run in one
+# embedder process on the training cores, started with the first sample
+_ingest_pool = ThreadPoolExecutor(max_workers=INGEST_WORKERS)
+_ingest_embedder = None
+_ingest_embedder_lock = threading.Lock()
+# Blob writes overlap with embedding on the synchronous path
+_io_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('AUDIO_IO_WORKERS', 4)))
+# Wakes long-polling status requests served by this process
+_ingest_done = threading.Condition()
+
+def probe_audio(audio_bytes):
+    """Cheap header-only check; returns (is_valid, message, duration_seconds)"""
+    try:
+        info = sf.info(io.BytesIO(audio_bytes))
+    except Exception as e:
+        return False, f"Invalid audio: {str(e)}", None
+    if info.duration < 0.5:
+        return False, "Audio too short (minimum 0.5 second)", info.duration
+    return True, "", info.duration
+
+def _discard_when_stored(put_future):
+    """Delete a blob once its in-flight write finishes, without waiting for it"""
+    def cleanup(future):
+        if future.exception() is None:
+            try:
+                delete_audio(future.result())
+            except Exception as e:
+                print(f"Failed to clean up stored audio: {e}")
+    put_future.add_done_callback(cleanup)
+
+def _finish_sample(sample_id, update):
+    result = audio_collection.update_one(
+        {'_id': sample_id, 'status': 'processing'}, {'$set': update})
+    with _ingest_done:
+        _ingest_done.notify_all()
+    return result.modified_count > 0
+
+def ingest_embedder():
+    """The background-ingest embedder process, (re)started on demand"""
+    global _ingest_embedder
+    with _ingest_embedder_lock:
+        if _ingest_embedder is None:
+            _ingest_embedder = start_embedder_pool()
+        return _ingest_embedder
+
+def _embed_upload(audio_bytes):
+    """Embedding of an uploaded clip computed off the inference cores; returns
+    (embedding, error)"""
+    global _ingest_embedder
+    embedder = ingest_embedder()
+    try:
+        embedding, error = embedder.submit(embed_clip, audio_bytes).result()
+    except BrokenProcessPool:
+        with _ingest_embedder_lock:
+            if _ingest_embedder is embedder:
+                _ingest_embedder = None
+        raise
+    if embedding is not None:
+        # Validation has to run in the embedder, so the cache only gets filled here
+        embedding_cache.put(hashlib.sha256(audio_bytes).hexdigest(), embedding)
+    return embedding, error
+
+def process_pending_sample(sample_id):
+    """Decode and embed a pending sample in the background"""
+    sample = audio_collection.find_one_and_update(
+        {'_id': sample_id, 'status': 'pending'},
+        {'$set': {'status': 'processing', 'claimed_at': datetime.datetime.now()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if sample is None:
+        return  # Deleted, or claimed by another worker
+
+    try:
+        audio_bytes = blob_store.get(sample['file_id'])
+        embedding, error = _embed_upload(audio_bytes)
+        if embedding is None:
+            _finish_sample(sample_id, {'status': 'failed', 'error': error})
+            return
+
+        update = {
+            'status': 'ready',
+            'embedding': embedding.tolist(),
+            'ready_at': datetime.datetime.now()
+        }
+        # Not counted if the sample was deleted while it was being embedded
+        if _finish_sample(sample_id, update):
+            update_class_stats([{**sample, **update}])
+    except Exception as e:
+        traceback.print_exc()
+        _finish_sample(sample_id, {'status': 'failed', 'error': str(e)})
+
+def requeue_pending_samples():
+    """Resubmit pending samples and ones whose processing lease expired"""
+    audio_collection.update_many(
+        {'status': 'processing',
+         'claimed_at': {'$lt': datetime.datetime.now() - INGEST_LEASE}},
+        {'$set': {'status': 'pending'}}
+    )
+    requeued = 0
+    for sample in audio_collection.find({'status': 'pending'}, {'_id': 1}):
+        _ingest_pool.submit(process_pending_sample, sample['_id'])
+        requeued += 1
+    return requeued
+
+def _wants_async():
+    flag = request.form.get('async') or request.args.get('async')
+    if flag is not None:
+        return flag.lower() == 'true'
+    return ASYNC_INGEST or 'respond-async' in request.headers.get('Prefer', '')
+
 @app.route('/api/audio/samples', methods=['POST'])
 def handle_samples():
-    """Handle audio sample uploads - automatically creates classes if needed"""
+    """Handle audio sample uploads - automatically creates classes if needed
+
+    With ``async=true`` (or ``Prefer: respond-async``) only the header is
+    checked before storing; the response is 202 with ``status: pending``
+    and decoding/embedding happens on the ingest pool.
+
+    Raw PCM bodies (application/octet-stream) name the class in
+    X-Audio-Class or ``?class=`` and are stored as 16-bit WAV.
+    """
     try:
-        if 'audio' not in request.files:
-            return jsonify({'error': 'No audio file provided'}), 400
-            
-        audio_file = request.files['audio']
-        class_label = request.form.get('class')
+        project = request_project()
+        waveform = None
+        if is_raw_pcm_request():
+            class_label = request.headers.get('X-Audio-Class') or request.args.get('class')
+            filename = request.headers.get('X-Filename') or 'recording.wav'
+            waveform, error = read_raw_pcm()
+            if error:
+                return jsonify({'error': error}), 400
+        else:
+            if 'audio' not in request.files:
+                return jsonify({'error': 'No audio file provided'}), 400
+            audio_file = request.files['audio']
+            class_label = request.form.get('class')
+            filename = audio_file.filename
         
         if not class_label:
             return jsonify({'error': 'No class specified'}), 400
             
         # Process audio first (before DB operations)
-        audio_bytes = audio_file.read()
-        is_valid, validation_msg = validate_audio(audio_bytes)
+        run_async = _wants_async()
+        if waveform is not None:
+            is_valid, validation_msg = validate_waveform(waveform)
+            duration = len(waveform) / SAMPLE_RATE
+            audio_bytes = encode_wav(waveform) if is_valid else None
+        else:
+            audio_bytes = audio_file.read()
+            if run_async:
+                is_valid, validation_msg, duration = probe_audio(audio_bytes)
+            else:
+                is_valid, validation_msg = validate_audio(audio_bytes)
+                duration = probe_audio(audio_bytes)[2] if is_valid else None
         if not is_valid:
             return jsonify({'error': validation_msg}), 400
             
         # Create class if it doesn't exist (upsert operation)
-        classes_collection.update_one(
-            {'name': class_label},
+        result = classes_collection.update_one(
+            {'project': project, 'name': class_label},
             {'$setOnInsert': {
                 'name': class_label,
+                'project': project,
                 'created_at': datetime.datetime.now()
             }},
             upsert=True
         )
+        if result.upserted_id is not None:
+            bump_classes_version(project)
         
-        # Store audio and metadata
-        file_id = fs.put(audio_bytes, filename=secure_filename(audio_file.filename))
-        embedding = extract_embedding(audio_bytes)
-        
-        if np.all(embedding == 0):
-            fs.delete(file_id)
-            return jsonify({'error': 'Failed to process audio features'}), 400
-            
         audio_doc = {
-            'file_id': file_id,
             'class': class_label,
+            'project': project,
+            'content_hash': hashlib.sha256(audio_bytes).hexdigest(),
             'timestamp': datetime.datetime.now(),
-            'filename': secure_filename(audio_file.filename),
-            'embedding': embedding.tolist()
+            'filename': secure_filename(filename),
+            'duration': duration
         }
-        result = audio_collection.insert_one(audio_doc)
+
+        # Store audio and metadata
+        if run_async:
+            audio_doc.update(store_audio(audio_bytes, audio_doc['filename']))
+            audio_doc['status'] = 'pending'
+            try:
+                result = audio_collection.insert_one(audio_doc)
+            except Exception:
+                delete_audio(audio_doc)
+                raise
+            _ingest_pool.submit(process_pending_sample, result.inserted_id)
+            return jsonify({
+                '_id': str(result.inserted_id),
+                'class': class_label,
+                'status': 'pending',
+                'timestamp': audio_doc['timestamp']
+            }), 202
+
+        # Encoding and the GridFS write run while YAMNet embeds
+        put_future = _io_pool.submit(store_audio, audio_bytes, audio_doc['filename'])
+        embedding = None
+        try:
+            if waveform is not None:
+                embedding = embed_decoded(audio_doc['content_hash'], waveform)
+            else:
+                embedding = extract_embedding(audio_bytes)
+        finally:
+            if embedding is None or np.all(embedding == 0):
+                _discard_when_stored(put_future)
+        
+        if np.all(embedding == 0):
+            return jsonify({'error': 'Failed to process audio features'}), 400
+
+        # Only commit the sample once both the blob and the embedding exist
+        audio_doc.update(put_future.result())
+        audio_doc.update({
+            'embedding': embedding.tolist(),
+            'status': 'ready',
+            'ready_at': datetime.datetime.now()
+        })
+        try:
+            result = audio_collection.insert_one(audio_doc)
+        except Exception:
+            delete_audio(audio_doc)
+            raise
+        update_class_stats([audio_doc])
         
         return jsonify({
             '_id': str(result.inserted_id),
             'class': class_label,
+            'status': 'ready',
             'timestamp': audio_doc['timestamp']
         }), 201
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/audio/samples/<sample_id>', methods=['DELETE'])
-def delete_sample(sample_id):
-    """Delete a specific audio sample"""
+SAMPLE_PAGE_SIZE = 50
+MAX_SAMPLE_PAGE_SIZE = 500
+SAMPLE_LIST_FIELDS = ('class', 'filename', 'timestamp', 'status', 'duration', 'content_type')
+# Embeddings are only returned when asked for by name
+SAMPLE_OPTIONAL_FIELDS = ('codec', 'size', 'content_hash', 'ready_at', 'error', 'embedding')
+
+def class_counts(project):
+    """Ready samples per class, from class_stats"""
+    return {class_name: stats.get('count', 0)
+            for class_name, stats in get_class_stats(project).items()}
+
+@app.route('/api/audio/samples', methods=['GET'])
+def list_samples():
+    """Page through the project's samples by _id
+
+    ``after`` is the last _id of the previous page (``next_after`` in the
+    response); ``order=desc`` pages newest first. ``fields`` picks the
+    returned fields and ``class`` filters. Per-class counts come with the
+    first page unless ``counts=false``, and with later ones on ``counts=true``.
+    """
+    try:
+        project = request_project()
+        try:
+            limit = min(int(request.args.get('limit', SAMPLE_PAGE_SIZE)), MAX_SAMPLE_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        if limit < 1:
+            return jsonify({'error': 'limit must be positive'}), 400
+        descending = request.args.get('order', 'asc') == 'desc'
+
+        fields = SAMPLE_LIST_FIELDS
+        if request.args.get('fields'):
+            fields = tuple(field.strip() for field in request.args['fields'].split(',')
+                           if field.strip())
+            unknown = set(fields) - set(SAMPLE_LIST_FIELDS + SAMPLE_OPTIONAL_FIELDS)
+            if unknown:
+                return jsonify({'error': f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
+
+        query = project_filter(project)
+        if request.args.get('class'):
+            query['class'] = request.args['class']
+        after = request.args.get('after')
+        if after:
+            try:
+                query['_id'] = {'$lt' if descending else '$gt': ObjectId(after)}
+            except:
+                return jsonify({'error': 'Invalid cursor'}), 400
+
+        docs = list(audio_collection.find(query, {field: 1 for field in fields})
+                    .sort('_id', -1 if descending else 1)
+                    .limit(limit + 1))
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+
+        response = {
+            'samples': [{'_id': str(doc['_id']), **{field: doc.get(field) for field in fields}}
+                        for doc in docs],
+            'next_after': str(docs[-1]['_id']) if has_more else None
+        }
+        if request.args.get('counts', 'false' if after else 'true') == 'true':
+            response['counts'] = class_counts(project)
+        return jsonify(response), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/audio/samples/<sample_id>/status', methods=['GET'])
+def sample_status(sample_id):
+    """Report ingest status; ``?wait=seconds`` long-polls until it settles"""
+    try:
+        obj_id = ObjectId(sample_id)
+    except:
+        return jsonify({'error': 'Invalid sample ID'}), 400
+
+    try:
+        try:
+            wait = float(request.args.get('wait', 0))
+        except ValueError:
+            return jsonify({'error': 'wait must be a number of seconds'}), 400
+        if not 0 <= wait < float('inf'):
+            return jsonify({'error': 'wait must be a non-negative number of seconds'}), 400
+
+        query = {'_id': obj_id, **project_filter(request_project())}
+        projection = {'status': 1, 'error': 1}
+        deadline = time.monotonic() + min(wait, MAX_STATUS_WAIT)
+        sample = audio_collection.find_one(query, projection)
+        while sample and sample.get('status') in ('pending', 'processing'):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Local completions wake us immediately; other workers' are seen by re-polling
+            with _ingest_done:
+                _ingest_done.wait(timeout=min(remaining, 0.5))
+            sample = audio_collection.find_one(query, projection)
+
+        if not sample:
+            return jsonify({'error': 'Sample not found'}), 404
+        response = {'_id': sample_id, 'status': sample.get('status', 'ready')}
+        if sample.get('error'):
+            response['error'] = sample['error']
+        return jsonify(response), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/audio/samples/<sample_id>', methods=['DELETE'])
+def delete_sample(sample_id):
+    """Delete a specific audio sample"""
     try:
         obj_id = ObjectId(sample_id)
     except:
         return jsonify({'error': 'Invalid sample ID'}), 400
     
     try:
-        sample = audio_collection.find_one({'_id': obj_id})
+        project = request_project()
+        # Document first: if the blob delete fails, GC reclaims the orphan.
+        # The deleted document's status decides whether it was counted.
+        sample = audio_collection.find_one_and_delete({'_id': obj_id, **project_filter(project)})
         if not sample:
             return jsonify({'error': 'Sample not found'}), 404
-        
-        fs.delete(sample['file_id'])
-        audio_collection.delete_one({'_id': obj_id})
+        if sample.get('status', 'ready') == 'ready':
+            update_class_stats([sample], sign=-1)
+        tombstones_collection.insert_one({
+            'sample_id': obj_id,
+            'project': project,
+            'deleted_at': datetime.datetime.now()
+        })
+        delete_audio(sample)
         return jsonify({'status': 'deleted'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/audio/samples/<sample_id>/play', methods=['GET'])
 def play_sample(sample_id):
-    """Play back a specific audio sample"""
+    """Play back a specific audio sample
+
+    Serves the Opus playback copy when there is one (``?original=true``
+    for the stored audio), in whatever codec it was stored.
+    """
     try:
         obj_id = ObjectId(sample_id)
-        sample = audio_collection.find_one({'_id': obj_id})
+        sample = audio_collection.find_one({'_id': obj_id, **project_filter(request_project())})
         if not sample:
             return jsonify({'error': 'Sample not found'}), 404
         
-        audio_file = fs.get(sample['file_id'])
+        if sample.get('playback_file_id') and request.args.get('original') != 'true':
+            file_id, mimetype = sample['playback_file_id'], 'audio/ogg'
+        else:
+            file_id, mimetype = sample['file_id'], sample.get('content_type', 'audio/wav')
+        # Local blobs go out via sendfile instead of being read into memory
+        path = blob_store.local_path(file_id)
+        if path:
+            return send_file(path, mimetype=mimetype, as_attachment=False, conditional=True)
         return send_file(
-            io.BytesIO(audio_file.read()),
-            mimetype='audio/wav',
+            io.BytesIO(blob_store.get(file_id)),
+            mimetype=mimetype,
             as_attachment=False
         )
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/audio/train', methods=['POST'])
-def train_model():
-    """Train the audio classification model"""
+# Bulk Import
+# Datasets are laid out as <class_name>/<file>, either as a directory on the
+# server (CLI) or a zip upload (API). Decoding runs in a process pool on the
+# training cores, embeddings are computed in batched YAMNet calls by an
+# embedder process on the same cores and samples are written with insert_many.
+IMPORT_BATCH_SIZE = int(os.environ.get('AUDIO_IMPORT_BATCH_SIZE', 64))
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+import_jobs_collection = db['import_jobs']
+# One import at a time per process; each already fans out over every training core
+_import_pool = ThreadPoolExecutor(max_workers=1)
+
+def _is_hidden(name):
+    return name.startswith('.') or name == '__MACOSX'
+
+def iter_dataset_files(root):
+    """Yield (class_name, path) for every file under root/<class_name>/"""
+    for class_name in sorted(os.listdir(root)):
+        class_dir = os.path.join(root, class_name)
+        if _is_hidden(class_name) or not os.path.isdir(class_dir):
+            continue
+        for dirpath, dirnames, filenames in os.walk(class_dir):
+            dirnames[:] = sorted(d for d in dirnames if not _is_hidden(d))
+            for filename in sorted(filenames):
+                if not _is_hidden(filename):
+                    yield class_name, os.path.join(dirpath, filename)
+
+def extract_dataset(archive_path, workdir):
+    """Unpack a dataset zip into workdir and return the dataset root.
+
+    Members with absolute or parent-relative paths are skipped, and a
+    single wrapping folder (dataset/<class_name>/...) is stepped into.
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        for member in archive.infolist():
+            parts = [part for part in member.filename.replace('\\', '/').split('/')
+                     if part not in ('', '.')]
+            if member.is_dir() or len(parts) < 2 or '..' in parts:
+                continue
+            target = os.path.join(workdir, *parts)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with archive.open(member) as src, open(target, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+
+    entries = [entry for entry in os.listdir(workdir) if not _is_hidden(entry)]
+    if len(entries) == 1:
+        wrapper = os.path.join(workdir, entries[0])
+        children = [child for child in os.listdir(wrapper) if not _is_hidden(child)]
+        if children and all(os.path.isdir(os.path.join(wrapper, c)) for c in children):
+            return wrapper
+    return workdir
+
+def _update_import_job(job_id, job):
+    import_jobs_collection.update_one({'_id': job_id}, {'$set': job})
+
+def _record_import_failure(job, name, error):
+    job['failed'] += 1
+    if len(job['errors']) < IMPORT_MAX_REPORTED_ERRORS:
+        job['errors'].append({'file': name, 'error': error})
+
+def upsert_classes(project, class_names):
+    """Create any of the named classes the project doesn't have yet"""
+    if not class_names:
+        return
+    now = datetime.datetime.now()
+    result = classes_collection.bulk_write([
+        UpdateOne(
+            {'project': project, 'name': class_name},
+            {'$setOnInsert': {'name': class_name, 'project': project, 'created_at': now}},
+            upsert=True
+        ) for class_name in class_names
+    ], ordered=False)
+    if result.upserted_count:
+        bump_classes_version(project)
+
+def bounded_map(executor, fn, items, window):
+    """executor.map that keeps at most window calls submitted, so results
+    can't pile up faster than they are consumed"""
+    items = iter(items)
+    pending = deque(executor.submit(fn, item) for item in itertools.islice(items, window))
+    while pending:
+        result = pending.popleft().result()
+        for item in itertools.islice(items, 1):
+            pending.append(executor.submit(fn, item))
+        yield result
+
+def _import_batch(batch, project, root, job, seen, embedder):
+    """Embed and store one batch of decoded clips; updates job counters"""
+    clips = []
+    for class_name, path, (waveform, error, digest, duration) in batch:
+        name = os.path.relpath(path, root)
+        if error:
+            _record_import_failure(job, name, error)
+        elif digest in seen:
+            job['skipped'] += 1
+        else:
+            seen.add(digest)
+            clips.append((class_name, path, name, waveform, digest, duration))
+
+    # Clips already in the project are skipped so imports can be re-run
+    if clips:
+        existing = {doc['content_hash'] for doc in audio_collection.find(
+            {'project': project, 'content_hash': {'$in': [clip[4] for clip in clips]}},
+            {'content_hash': 1, '_id': 0}
+        )}
+        job['skipped'] += sum(1 for clip in clips if clip[4] in existing)
+        clips = [clip for clip in clips if clip[4] not in existing]
+    if not clips:
+        return
+
+    embeddings = [embedding_cache.get(clip[4]) for clip in clips]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        computed = embedder.submit(embed_batch, np.stack([clips[i][3] for i in missing])).result()
+        for i, embedding in zip(missing, computed):
+            embedding_cache.put(clips[i][4], embedding)
+            embeddings[i] = embedding
+
+    def store(clip):
+        with open(clip[1], 'rb') as f:
+            return store_audio(f.read(), secure_filename(os.path.basename(clip[1])))
+    stored = list(_io_pool.map(store, clips))
+
+    class_names = sorted({clip[0] for clip in clips})
+    upsert_classes(project, class_names)
+    now = datetime.datetime.now()
+
+    docs = [{
+        'class': class_name,
+        'project': project,
+        'content_hash': digest,
+        'timestamp': now,
+        'filename': secure_filename(os.path.basename(path)),
+        **storage,
+        'embedding': np.asarray(embedding, dtype=np.float32).tolist(),
+        'duration': duration,
+        'status': 'ready',
+        'ready_at': now
+    } for (class_name, path, _, _, digest, duration), storage, embedding
+        in zip(clips, stored, embeddings)]
     try:
-        # Verify minimum requirements
-        class_count = classes_collection.count_documents({})
-        if class_count < 2:
-            return jsonify({'error': 'Need at least 2 classes to train'}), 400
+        audio_collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Unordered inserts keep going past errors; only the failed documents'
+        # audio is unreferenced. Other errors leave their blobs to GC.
+        errors = {error['index']: error['errmsg'] for error in e.details['writeErrors']}
+        for i, error in errors.items():
+            _record_import_failure(job, clips[i][2], error)
+        release_blobs([docs[i][field] for i in errors
+                       for field in ('file_id', 'playback_file_id') if docs[i].get(field)])
+        docs = [doc for i, doc in enumerate(docs) if i not in errors]
+    update_class_stats(docs)
+    job['imported'] += len(docs)
+    job['classes'] = sorted(set(job['classes']) | set(class_names))
+
+def _import_dataset(root, project, job, report):
+    files = list(iter_dataset_files(root))
+    job['total'] = len(files)
+    report()
+
+    seen = set()
+    workers = available_cores()
+    executor = start_decoder_pool(workers)
+    embedder = start_embedder_pool()
+    try:
+        decoded = bounded_map(executor, decode_file, [path for _, path in files],
+                              IMPORT_BATCH_SIZE * workers)
+        batch = []
+        for (class_name, path), result in zip(files, decoded):
+            batch.append((class_name, path, result))
+            if len(batch) < IMPORT_BATCH_SIZE:
+                continue
+            _import_batch(batch, project, root, job, seen, embedder)
+            job['processed'] += len(batch)
+            batch = []
+            report()
+        if batch:
+            _import_batch(batch, project, root, job, seen, embedder)
+            job['processed'] += len(batch)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        embedder.shutdown(wait=True, cancel_futures=True)
+
+def archive_kind(path):
+    """'tar' for export archives, 'zip' for dataset zips, else None.
+
+    Tar goes first: a small export ends with embeddings.npz, whose zip
+    directory then falls in the window is_zipfile() searches.
+    """
+    if tarfile.is_tarfile(path):
+        return 'tar'
+    if zipfile.is_zipfile(path):
+        return 'zip'
+    return None
+
+def run_import(source, project=DEFAULT_PROJECT, job_id=None, progress=None):
+    """Import a dataset directory/zip or an export archive; returns the job document.
+
+    Progress is saved to ``import_jobs`` after every batch and passed to
+    ``progress`` when given. Files that fail to decode or validate are
+    reported in ``errors`` and don't stop the import.
+    """
+    job = {
+        'project': project,
+        'status': 'running',
+        'total': 0,
+        'processed': 0,
+        'imported': 0,
+        'skipped': 0,
+        'failed': 0,
+        'errors': [],
+        'classes': [],
+        'started_at': datetime.datetime.now()
+    }
+    if job_id is None:
+        job_id = import_jobs_collection.insert_one(dict(job)).inserted_id
+    else:
+        _update_import_job(job_id, job)
+
+    def report():
+        _update_import_job(job_id, job)
+        if progress:
+            progress(job)
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            kind = None if os.path.isdir(source) else archive_kind(source)
+            if os.path.isdir(source):
+                _import_dataset(source, project, job, report)
+            elif kind == 'tar':
+                restore_archive(source, project, workdir, job, report)
+            elif kind == 'zip':
+                _import_dataset(extract_dataset(source, workdir), project, job, report)
+            else:
+                raise ValueError(f"Not a directory, zip or export archive: {source}")
+        job['status'] = 'completed'
+    except Exception as e:
+        traceback.print_exc()
+        job.update({'status': 'failed', 'error': str(e)})
+    job['finished_at'] = datetime.datetime.now()
+    report()
+    return dict(job, _id=job_id)
+
+def _import_upload(archive_path, project, job_id):
+    try:
+        run_import(archive_path, project, job_id)
+    finally:
+        os.remove(archive_path)
+
+def _serialize_import_job(job):
+    job = dict(job, _id=str(job['_id']))
+    for key in ('started_at', 'finished_at'):
+        if job.get(key):
+            job[key] = job[key].isoformat()
+    return job
+
+@app.route('/api/audio/samples/import', methods=['POST'])
+def import_samples():
+    """Start a bulk import from a <class_name>/<file> zip or an export archive"""
+    try:
+        if 'archive' not in request.files:
+            return jsonify({'error': 'No archive provided'}), 400
+        project = request_project()
+
+        fd, archive_path = tempfile.mkstemp()
+        os.close(fd)
+        request.files['archive'].save(archive_path)
+        if archive_kind(archive_path) is None:
+            os.remove(archive_path)
+            return jsonify({'error': 'Archive must be a dataset zip or an export tar'}), 400
+
+        job_id = import_jobs_collection.insert_one({
+            'project': project,
+            'status': 'queued',
+            'started_at': datetime.datetime.now()
+        }).inserted_id
+        _import_pool.submit(_import_upload, archive_path, project, job_id)
+        return jsonify({'job_id': str(job_id), 'status': 'queued'}), 202
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/audio/samples/import/<job_id>', methods=['GET'])
+def import_status(job_id):
+    """Progress and per-file failures of a bulk import"""
+    try:
+        try:
+            job_oid = ObjectId(job_id)
+        except:
+            return jsonify({'error': 'Invalid job ID'}), 400
+
+        job = import_jobs_collection.find_one({'_id': job_oid, 'project': request_project()})
+        if not job:
+            return jsonify({'error': 'Import job not found'}), 404
+        return jsonify(_serialize_import_job(job))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Export Archives
+# A project exports as an uncompressed tar, written in this order so it can
+# be restored in a single streaming pass:
+#   manifest.json   format, project, embedding version/dim, classes
+#   samples.jsonl   one line per sample, in embedding row order
+#   embeddings.npz  float32 (samples, EMBEDDING_DIM) matrix named "embeddings"
+#   audio/<key>     original upload bytes, keyed by content hash
+ARCHIVE_FORMAT = 1
+ARCHIVE_QUEUE_CHUNKS = 64
+
+def _spool_export(project, workdir):
+    """Write samples.jsonl and embeddings.npz to workdir; returns (count, blobs)"""
+    samples_path = os.path.join(workdir, 'samples.jsonl')
+    raw_path = os.path.join(workdir, 'embeddings.f32')
+    blobs = {}
+    count = 0
+    cursor = audio_collection.find(
+        {**project_filter(project), 'status': 'ready'},
+        {'class': 1, 'content_hash': 1, 'filename': 1, 'timestamp': 1,
+         'duration': 1, 'file_id': 1, 'codec': 1, 'content_type': 1, 'embedding': 1}
+    ).sort('_id', 1).batch_size(1000)
+    with open(samples_path, 'w') as samples, open(raw_path, 'wb') as raw:
+        for doc in cursor:
+            key = doc.get('content_hash') or str(doc['file_id'])
+            blobs.setdefault(key, doc['file_id'])
+            raw.write(np.asarray(doc['embedding'], dtype=np.float32).tobytes())
+            samples.write(json.dumps({
+                'id': str(doc['_id']),
+                'class': doc['class'],
+                'content_hash': doc.get('content_hash'),
+                'filename': doc.get('filename'),
+                'timestamp': doc['timestamp'].isoformat() if doc.get('timestamp') else None,
+                'duration': doc.get('duration'),
+                'codec': doc.get('codec'),
+                'content_type': doc.get('content_type', 'audio/wav'),
+                'audio': f"audio/{key}"
+            }) + '\n')
+            count += 1
+
+    # Stream the raw rows into the .npy member instead of building the array
+    npz_path = os.path.join(workdir, 'embeddings.npz')
+    with zipfile.ZipFile(npz_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as npz, \
+            npz.open('embeddings.npy', 'w', force_zip64=True) as member, \
+            open(raw_path, 'rb') as raw:
+        np.lib.format.write_array_header_1_0(member, {
+            'descr': '<f4', 'fortran_order': False, 'shape': (count, EMBEDDING_DIM)
+        })
+        shutil.copyfileobj(raw, member)
+    os.remove(raw_path)
+    return count, blobs
+
+def write_archive(project, fileobj):
+    """Write a project's export archive to a writable stream; returns the manifest"""
+    with tempfile.TemporaryDirectory() as workdir:
+        count, blobs = _spool_export(project, workdir)
+        manifest = {
+            'format': ARCHIVE_FORMAT,
+            'project': project,
+            'embedding_version': EMBEDDING_VERSION,
+            'embedding_dim': EMBEDDING_DIM,
+            'samples': count,
+            'classes': sorted(doc['name'] for doc in classes_collection.find(
+                project_filter(project), {'name': 1})),
+            'exported_at': datetime.datetime.now().isoformat()
+        }
+        with tarfile.open(fileobj=fileobj, mode='w|') as tar:
+            data = json.dumps(manifest, indent=2).encode()
+            info = tarfile.TarInfo('manifest.json')
+            info.size = len(data)
+            info.mtime = time.time()
+            tar.addfile(info, io.BytesIO(data))
+            tar.add(os.path.join(workdir, 'samples.jsonl'), arcname='samples.jsonl')
+            tar.add(os.path.join(workdir, 'embeddings.npz'), arcname='embeddings.npz')
+
+            for key, file_id in blobs.items():
+                try:
+                    blob = blob_store.open(file_id)
+                except BlobNotFound:
+                    print(f"Audio {file_id} missing from the blob store; left out of export")
+                    continue
+                with blob:
+                    info = tarfile.TarInfo(f"audio/{key}")
+                    info.size = blob_store.size(file_id)
+                    info.mtime = time.time()
+                    tar.addfile(info, blob)
+    return manifest
 
-        # Prepare training data
-        X, y = [], []
-        for audio_doc in audio_collection.find():
+class _QueueWriter(io.RawIOBase):
+    """File-like sink handing written chunks to a bounded queue"""
+
+    def __init__(self, chunks, cancelled):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def put(self, item):
+        while not self.cancelled.is_set():
             try:
-                X.append(np.array(audio_doc['embedding'], dtype=np.float32))
-                y.append(audio_doc['class'])
-            except Exception as e:
-                print(f"Error loading audio {audio_doc['_id']}: {e}")
+                self.chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+        raise IOError('Export cancelled')
 
-        if len(X) < 5:
-            return jsonify({'error': 'Need at least 5 samples to train'}), 400
+    def write(self, data):
+        self.put(bytes(data))
+        self.position += len(data)
+        return len(data)
 
-        X = np.array(X)
-        le = LabelEncoder()
-        y_encoded = le.fit_transform(y)
-
-        # Adjust test size based on sample count
-        test_size = min(0.2, 1 - (len(le.classes_) / len(X)))
-        if test_size <= 0:
-            test_size = 0.1
-
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y_encoded, 
-            test_size=test_size, 
-            random_state=42, 
-            stratify=y_encoded
-        )
+def stream_writes(write):
+    """Yield what ``write(fileobj)`` writes, as it is written.
 
-        # Build and train model
-        model = Sequential([
-            Input(shape=(X.shape[1],)),
-            Dense(512, activation='relu', kernel_regularizer='l2'),
-            Dropout(0.5),
-            BatchNormalization(),
-            Dense(256, activation='relu', kernel_regularizer='l2'),
-            Dropout(0.5),
-            BatchNormalization(),
-            Dense(len(le.classes_), activation='softmax')
-        ])
+    The writer runs on a separate thread; the bounded queue keeps at most
+    ARCHIVE_QUEUE_CHUNKS writes in memory, and a client that disconnects
+    cancels the writer.
+    """
+    chunks = queue.Queue(maxsize=ARCHIVE_QUEUE_CHUNKS)
+    cancelled = threading.Event()
+    writer = _QueueWriter(chunks, cancelled)
+    done = object()
+
+    def produce():
+        try:
+            write(writer)
+        except Exception:
+            if not cancelled.is_set():
+                traceback.print_exc()
+        finally:
+            try:
+                writer.put(done)
+            except IOError:
+                pass
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                return
+            yield chunk
+    finally:
+        cancelled.set()
+
+def _iter_npy_rows(npz_path, name='embeddings.npy', rows_per_read=1024):
+    """Yield rows of a float32 matrix inside an .npz without loading all of it"""
+    with zipfile.ZipFile(npz_path) as npz, npz.open(name) as member:
+        version = np.lib.format.read_magic(member)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(member)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(member)
+        if fortran_order or dtype != np.dtype('<f4') or len(shape) != 2:
+            raise ValueError('embeddings.npz must hold a C-ordered float32 matrix')
+        row_bytes = shape[1] * dtype.itemsize
+        remaining = shape[0]
+        while remaining:
+            n = min(rows_per_read, remaining)
+            block = np.frombuffer(member.read(n * row_bytes), dtype=dtype).reshape(n, shape[1])
+            yield from block
+            remaining -= n
+
+def _iter_jsonl(path):
+    with open(path) as f:
+        for line in f:
+            yield json.loads(line)
+
+def restore_archive(source, project, workdir, job, report):
+    """Restore an export archive into a project with bulk writes.
+
+    Embeddings are reused when the archive's EMBEDDING_VERSION matches ours;
+    otherwise the audio is decoded and embedded again. Samples whose audio
+    is already in the project are skipped.
+    """
+    manifest = None
+    reuse_embeddings = False
+    audio_files = {}   # audio member name -> (file_id, content_hash, local path, size)
+    needed = {}        # audio member name -> filename of its sample
+    skip_rows = set()
+    samples_path = os.path.join(workdir, 'samples.jsonl')
+    npz_path = os.path.join(workdir, 'embeddings.npz')
+    audio_dir = os.path.join(workdir, 'audio')
+    os.makedirs(audio_dir)
+
+    with tarfile.open(source, mode='r|*') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            stream = tar.extractfile(member)
+            if member.name == 'manifest.json':
+                manifest = json.load(stream)
+                if manifest.get('format') != ARCHIVE_FORMAT:
+                    raise ValueError(f"Unsupported archive format: {manifest.get('format')}")
+                reuse_embeddings = (manifest.get('embedding_version') == EMBEDDING_VERSION
+                                    and manifest.get('embedding_dim') == EMBEDDING_DIM)
+                job.update({'total': manifest['samples'], 'classes': manifest['classes']})
+                upsert_classes(project, manifest['classes'])
+                report()
+            elif manifest is None:
+                raise ValueError('Archive must start with manifest.json')
+            elif member.name == 'samples.jsonl':
+                with open(samples_path, 'wb') as f:
+                    shutil.copyfileobj(stream, f)
+                needed, skip_rows = _plan_restore(samples_path, project)
+            elif member.name == 'embeddings.npz':
+                if reuse_embeddings:
+                    with open(npz_path, 'wb') as f:
+                        shutil.copyfileobj(stream, f)
+            elif member.name in needed:
+                audio_bytes = stream.read()
+                path = None
+                if not reuse_embeddings:
+                    path = os.path.join(audio_dir, str(len(audio_files)))
+                    with open(path, 'wb') as f:
+                        f.write(audio_bytes)
+                audio_files[member.name] = (
+                    blob_store.put(audio_bytes, filename=secure_filename(needed[member.name] or '')),
+                    hashlib.sha256(audio_bytes).hexdigest(),
+                    path,
+                    len(audio_bytes)
+                )
+    if manifest is None or not os.path.exists(samples_path):
+        raise ValueError('Archive is missing manifest.json or samples.jsonl')
+    if reuse_embeddings and not os.path.exists(npz_path):
+        raise ValueError('Archive is missing embeddings.npz')
 
-        model.compile(
-            optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
-            loss='sparse_categorical_crossentropy',
-            metrics=['accuracy']
+    rows = _iter_jsonl(samples_path)
+    inserted = set()
+    if reuse_embeddings:
+        rows = zip(rows, _iter_npy_rows(npz_path))
+        _restore_rows(rows, project, job, report, audio_files, skip_rows, inserted, None, None)
+    else:
+        executor = start_decoder_pool()
+        embedder = start_embedder_pool()
+        try:
+            _restore_rows(((row, None) for row in rows), project, job, report,
+                          audio_files, skip_rows, inserted, executor, embedder)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            embedder.shutdown(wait=True, cancel_futures=True)
+
+    # Audio stored for rows that failed to decode or insert
+    for file_id, _, _, _ in audio_files.values():
+        if file_id not in inserted:
+            release_blob(file_id)
+
+def _plan_restore(samples_path, project):
+    """Decide which rows to restore; returns (needed audio members, skipped row numbers)"""
+    needed = {}
+    skip_rows = set()
+    seen = set()
+    rows = enumerate(_iter_jsonl(samples_path))
+    while True:
+        chunk = list(itertools.islice(rows, 1000))
+        if not chunk:
+            return needed, skip_rows
+        hashes = [row['content_hash'] for _, row in chunk if row.get('content_hash')]
+        existing = {doc['content_hash'] for doc in audio_collection.find(
+            {'project': project, 'content_hash': {'$in': hashes}},
+            {'content_hash': 1, '_id': 0}
+        )} if hashes else set()
+        for i, row in chunk:
+            digest = row.get('content_hash')
+            if digest and (digest in existing or digest in seen):
+                skip_rows.add(i)
+                continue
+            if digest:
+                seen.add(digest)
+            needed.setdefault(row['audio'], row.get('filename'))
+
+def _restore_rows(rows, project, job, report, audio_files, skip_rows, inserted,
+                  executor, embedder):
+    """Insert restored samples in batches, re-decoding and embedding when the
+    decoder and embedder pools are given"""
+    used = set()
+
+    def flush(batch):
+        if executor is not None and batch:
+            decoded = list(executor.map(decode_file, [entry[3] for entry in batch]))
+            keep = []
+            for entry, (waveform, error, _, _) in zip(batch, decoded):
+                if error:
+                    _record_import_failure(job, entry[0]['audio'], error)
+                else:
+                    keep.append((entry, waveform))
+            batch = []
+            if keep:
+                embeddings = embedder.submit(
+                    embed_batch, np.stack([waveform for _, waveform in keep])).result()
+                for (entry, _), embedding in zip(keep, embeddings):
+                    embedding_cache.put(entry[2], embedding)
+                    batch.append(entry[:1] + (embedding,) + entry[2:])
+        if batch:
+            now = datetime.datetime.now()
+            docs = [{
+                'class': row['class'],
+                'project': project,
+                'content_hash': digest,
+                'timestamp': (datetime.datetime.fromisoformat(row['timestamp'])
+                              if row.get('timestamp') else now),
+                'filename': row.get('filename'),
+                'file_id': file_id,
+                'codec': row.get('codec'),
+                'content_type': row.get('content_type', 'audio/wav'),
+                'size': size,
+                'embedding': np.asarray(embedding, dtype=np.float32).tolist(),
+                'duration': row.get('duration'),
+                'status': 'ready',
+                'ready_at': now
+            } for row, embedding, digest, _, file_id, size in batch]
+            failed = {}
+            try:
+                audio_collection.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                failed = {error['index']: error['errmsg'] for error in e.details['writeErrors']}
+            for i, error in failed.items():
+                _record_import_failure(job, batch[i][0]['audio'], error)
+            docs = [doc for i, doc in enumerate(docs) if i not in failed]
+            update_class_stats(docs)
+            # Blobs of failed rows stay out of inserted, so restore_archive releases them
+            inserted.update(doc['file_id'] for doc in docs)
+            job['imported'] += len(docs)
+        report()
+
+    batch = []
+    for i, (row, embedding) in enumerate(rows):
+        job['processed'] += 1
+        audio = audio_files.get(row['audio'])
+        if i in skip_rows or (audio and audio[0] in used):
+            job['skipped'] += 1
+            continue
+        if audio is None:
+            _record_import_failure(job, row['audio'], 'Audio missing from archive')
+            continue
+        file_id, digest, path, size = audio
+        # Keep the original upload's hash; stored bytes may have been re-encoded
+        digest = row.get('content_hash') or digest
+        # Legacy rows exported without a hash are only checked once their bytes arrive
+        if not row.get('content_hash') and audio_collection.find_one(
+                {'project': project, 'content_hash': digest}, {'_id': 1}):
+            job['skipped'] += 1
+            continue
+        used.add(file_id)
+        batch.append((row, embedding, digest, path, file_id, size))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush(batch)
+            batch = []
+    flush(batch)
+
+@app.route('/api/audio/export', methods=['GET'])
+def export_project():
+    """Stream the project's samples, embeddings and audio as a tar archive"""
+    try:
+        project = request_project()
+        filename = f"{secure_filename(project) or 'project'}-export.tar"
+        return Response(
+            stream_with_context(stream_writes(lambda f: write_archive(project, f))),
+            mimetype='application/x-tar',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
         )
 
-        # Train with class weights
-        class_weights = compute_class_weight('balanced', classes=np.unique(y_encoded), y=y_encoded)
-        history = model.fit(
-            X_train, y_train,
-            epochs=50,
-            batch_size=32,
-            validation_data=(X_test, y_test),
-            class_weight=dict(enumerate(class_weights)),
-            callbacks=[tf.keras.callbacks.EarlyStopping(patience=5, restore_best_weights=True)],
-            verbose=2
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Columnar Export
+# Embeddings and metadata as Arrow IPC or Parquet record batches, with each
+# vector a fixed-size list of float32 so readers get an (n, 1024) buffer
+COLUMNAR_BATCH_ROWS = 4096
+COLUMNAR_FORMATS = {
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+def columnar_schema(project):
+    return pa.schema([
+        ('id', pa.string()),
+        ('class', pa.string()),
+        ('content_hash', pa.string()),
+        ('filename', pa.string()),
+        ('timestamp', pa.timestamp('ms')),
+        ('ready_at', pa.timestamp('ms')),
+        ('duration', pa.float32()),
+        ('embedding', pa.list_(pa.float32(), EMBEDDING_DIM))
+    ], metadata={
+        'project': project,
+        'embedding_version': EMBEDDING_VERSION
+    })
+
+def iter_record_batches(project, schema, class_name=None, batch_rows=COLUMNAR_BATCH_ROWS):
+    """Read ready samples in _id order and yield them as Arrow record batches"""
+    query = {**project_filter(project), 'status': 'ready'}
+    if class_name:
+        query['class'] = class_name
+    cursor = audio_collection.find(
+        query,
+        {'class': 1, 'content_hash': 1, 'filename': 1, 'timestamp': 1,
+         'ready_at': 1, 'duration': 1, 'embedding': 1}
+    ).sort('_id', 1).batch_size(batch_rows)
+
+    while True:
+        docs = list(itertools.islice(cursor, batch_rows))
+        if not docs:
+            return
+        embeddings = np.asarray([doc['embedding'] for doc in docs], dtype=np.float32)
+        yield pa.RecordBatch.from_arrays([
+            pa.array([str(doc['_id']) for doc in docs], pa.string()),
+            pa.array([doc['class'] for doc in docs], pa.string()),
+            pa.array([doc.get('content_hash') for doc in docs], pa.string()),
+            pa.array([doc.get('filename') for doc in docs], pa.string()),
+            pa.array([doc.get('timestamp') for doc in docs], pa.timestamp('ms')),
+            pa.array([doc.get('ready_at') for doc in docs], pa.timestamp('ms')),
+            pa.array([doc.get('duration') for doc in docs], pa.float32()),
+            pa.FixedSizeListArray.from_arrays(pa.array(embeddings.ravel()), EMBEDDING_DIM)
+        ], schema=schema)
+
+def write_columnar(project, fileobj, fmt='parquet', class_name=None):
+    """Write ready samples as an Arrow IPC stream or Parquet file; returns the row count"""
+    if pa is None:
+        raise RuntimeError('pyarrow is not installed')
+    if fmt not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    schema = columnar_schema(project)
+    if fmt == 'arrow':
+        writer = pa.ipc.new_stream(fileobj, schema)
+    else:
+        writer = pq.ParquetWriter(fileobj, schema)
+    rows = 0
+    try:
+        for batch in iter_record_batches(project, schema, class_name):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+    return rows
+
+@app.route('/api/audio/export/embeddings', methods=['GET'])
+def export_embeddings():
+    """Stream embeddings and metadata as Arrow IPC (?format=arrow) or Parquet"""
+    try:
+        if pa is None:
+            return jsonify({'error': 'Columnar export requires pyarrow'}), 501
+        fmt = request.args.get('format', 'parquet')
+        if fmt not in COLUMNAR_FORMATS:
+            return jsonify({'error': f"format must be one of {sorted(COLUMNAR_FORMATS)}"}), 400
+        project = request_project()
+        class_name = request.args.get('class')
+
+        extension = 'arrows' if fmt == 'arrow' else 'parquet'
+        filename = f"{secure_filename(project) or 'project'}-embeddings.{extension}"
+        return Response(
+            stream_with_context(stream_writes(
+                lambda f: write_columnar(project, f, fmt, class_name))),
+            mimetype=COLUMNAR_FORMATS[fmt],
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
         )
 
-        # Save model
-        with tempfile.NamedTemporaryFile(suffix='.h5', delete=False) as model_file:
-            model.save(model_file.name)
-            model_bytes = model_file.read()
-        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/audio/snapshot/sync', methods=['POST'])
+def sync_snapshot():
+    """Bring the local embedding snapshot up to date with Mongo"""
+    try:
+        snapshot = get_snapshot(request_project())
+        if request.args.get('rebuild') == 'true':
+            snapshot.reset()
+        return jsonify(snapshot.sync()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/audio/train', methods=['POST'])
+def train_model():
+    """Train the audio classification model
+
+    An optional JSON body ``{"search": {"mode": "random"|"grid", "trials": n,
+    "time_budget": seconds}}`` evaluates several head configs in parallel
+    and trains the final model with the best one. ``{"cv": {"folds": k}}``
+    reports stratified k-fold accuracy and trains the final model on all
+    samples. ``"promote": false`` stores the model without serving it.
+    """
+    try:
+        options = request.get_json(silent=True) or {}
+        project = request_project()
+
+        # "search": true means the defaults, like "cv": true
+        search = options.get('search')
+        if search is True:
+            search = {}
+        elif search is False:
+            search = None
+        if search is not None and not isinstance(search, dict):
+            return jsonify({'error': 'search must be an object or true'}), 400
+        if search is not None and search.get('mode', 'random') not in ('random', 'grid'):
+            return jsonify({'error': 'search mode must be "random" or "grid"'}), 400
+        if search is not None:
+            trials = search.get('trials')
+            if trials is not None and (
+                isinstance(trials, bool) or not isinstance(trials, int) or trials < 1
+            ):
+                return jsonify({'error': 'search trials must be a positive integer'}), 400
+            time_budget = search.get('time_budget', SEARCH_TIME_BUDGET)
+            if (isinstance(time_budget, bool) or not isinstance(time_budget, (int, float))
+                    or not 0 < time_budget < float('inf')):
+                return jsonify({'error': 'search time_budget must be a positive number'}), 400
+
+        # Verify minimum requirements from the per-class counters before loading anything
+        counts = [count for count in class_counts(project).values() if count > 0]
+        if len(counts) < 2:
+            return jsonify({'error': 'Need at least 2 classes to train'}), 400
+        if sum(counts) < 5:
+            return jsonify({'error': 'Need at least 5 samples to train'}), 400
+
+        # Prepare training data from the project's local snapshot
+        snapshot = get_snapshot(project)
+        snapshot.sync()
+        # All fitting runs in training processes that memory-map the snapshot's
+        # embeddings in place, through a link that survives concurrent syncs
+        with tempfile.TemporaryDirectory(dir=snapshot.path) as workdir:
+            matrix_path, rows, y, _ = snapshot.link(workdir)
+
+            if len(y) < 5:
+                return jsonify({'error': 'Need at least 5 samples to train'}), 400
+
+            le = LabelEncoder()
+            y_encoded = le.fit_transform(y)
+            # Both the stratified split and cross-validation need two of each class
+            if np.min(np.bincount(y_encoded)) < 2:
+                return jsonify({'error': 'Need at least 2 samples in every class to train'}), 400
+
+            # Adjust test size based on sample count
+            test_size = min(0.2, 1 - (len(le.classes_) / len(y)))
+            if test_size <= 0:
+                test_size = 0.1
+
+            # Split data
+            train_idx, val_idx = train_test_split(
+                np.arange(len(y)),
+                test_size=test_size,
+                random_state=42,
+                stratify=y_encoded
+            )
+
+            # Train with class weights
+            class_weights = dict(enumerate(
+                compute_class_weight('balanced', classes=np.unique(y_encoded), y=y_encoded)
+            ))
+
+            config = dict(DEFAULT_HEAD_CONFIG)
+            search_summary = None
+            cv_summary = None
+            shared = share_rows(matrix_path, rows, y_encoded, workdir)
+
+            # Optionally search head hyperparameters in a process pool first
+            if search is not None:
+                configs = search_configs(search.get('mode', 'random'), search.get('trials'))
+                time_budget = float(time_budget)
+                leaderboard = run_search(
+                    shared, train_idx, val_idx, configs, class_weights, time_budget
+                )
+                if leaderboard:
+                    config = dict(leaderboard[0]['config'])
+                search_summary = {
+                    'mode': search.get('mode', 'random'),
+                    'time_budget': time_budget,
+                    'trials_planned': len(configs),
+                    'trials_run': len(leaderboard),
+                    'leaderboard': leaderboard
+                }
+
+            cv = options.get('cv')
+            if cv:
+                folds = int(cv.get('folds', CV_FOLDS)) if isinstance(cv, dict) else CV_FOLDS
+                cv_summary = run_cross_validation(
+                    shared, y_encoded, config, class_weights, folds
+                )
+                cv_summary['labels'] = le.classes_.tolist()
+
+                # No held-out data left, so train for the folds' typical best epoch count
+                final_config = dict(config, epochs=int(np.median(cv_summary['best_epochs'])))
+                model_bytes, _ = train_final(
+                    shared, np.arange(len(y)), None, final_config, class_weights
+                )
+                accuracy = cv_summary['mean_accuracy']
+            else:
+                model_bytes, history = train_final(
+                    shared, train_idx, val_idx, config, class_weights
+                )
+                accuracy = history['val_accuracy'][-1]
+
+        # Save label encoder
         with tempfile.NamedTemporaryFile(suffix='.pkl', delete=False) as le_file:
             joblib.dump(le, le_file.name)
             le_bytes = le_file.read()
 
-        model_collection.insert_one({
+        model_doc = {
             'model': model_bytes,
             'label_encoder': le_bytes,
-            'accuracy': float(history.history['val_accuracy'][-1]),
+            'accuracy': accuracy,
             'timestamp': datetime.datetime.now(),
-            'classes': le.classes_.tolist()
-        })
+            'classes': le.classes_.tolist(),
+            'config': config,
+            'project': project
+        }
+        if search_summary:
+            model_doc['search'] = search_summary
+        if cv_summary:
+            model_doc['cv'] = cv_summary
+        model_id = model_collection.insert_one(model_doc).inserted_id
+        promoted = bool(options.get('promote', AUTO_PROMOTE))
+        if promoted:
+            set_active_model(model_id, project)
+            # Results from the project's older models are unreachable now; free the memory
+            prediction_cache.discard_where(lambda key: key[0] == project)
 
-        return jsonify({
+        response = {
             'status': 'success',
-            'accuracy': history.history['val_accuracy'][-1],
-            'classes': le.classes_.tolist()
-        })
+            'model_id': str(model_id),
+            'promoted': promoted,
+            'accuracy': accuracy,
+            'classes': le.classes_.tolist(),
+            'config': config
+        }
+        if search_summary:
+            response['search'] = search_summary
+        if cv_summary:
+            response['cv'] = cv_summary
+        return jsonify(response)
     except Exception as e:
         print(f"Training error: {str(e)}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+# Prediction Helpers
+PREDICTION_TEMPERATURE = 0.5
+BATCH_CHUNK_SIZE = 32
+MAX_BATCH_FILES = int(os.environ.get('AUDIO_MAX_BATCH_FILES', 1000))
+# Uncompressed size allowed across every zip in one batch request
+MAX_BATCH_BYTES = int(os.environ.get('AUDIO_MAX_BATCH_BYTES', 512 * 1024 * 1024))
+
+_decode_pool = ThreadPoolExecutor(max_workers=max(1, cpu_budget.cores_for('inference')))
+
+# Bump when decoding, windowing or temperature scaling changes cached results
+PREPROCESSING_VERSION = 1
+prediction_cache = LRUCache(
+    max_entries=int(os.environ.get('AUDIO_PREDICTION_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('AUDIO_PREDICTION_CACHE_TTL', 0)) or None
+)
+
+# Model Registry
+MODEL_POOL_BYTES = int(os.environ.get('AUDIO_MODEL_POOL_BYTES', 512 * 1024 * 1024))
+MODEL_HISTORY_LENGTH = 20
+AUTO_PROMOTE = os.environ.get('AUDIO_AUTO_PROMOTE', 'true').lower() == 'true'
+
+def _loaded_model_bytes(loaded):
+    model, _, _ = loaded
+    return sum(weights.nbytes for weights in model.get_weights())
+
+# Deserialized (model, label encoder, project) triples for all tenants, by model id
+model_pool = ModelPool(MODEL_POOL_BYTES, _loaded_model_bytes)
+
+def latest_model_id(project=DEFAULT_PROJECT):
+    """_id of the project's newest model without fetching its blobs"""
+    model_doc = model_collection.find_one(
+        project_filter(project), {'_id': 1}, sort=[('timestamp', -1)]
+    )
+    return model_doc['_id'] if model_doc else None
+
+def _pointer_id(project):
+    return f"active:{project}"
+
+def active_model_id(project=DEFAULT_PROJECT):
+    """Model a project serves by default: the promoted one, else the newest"""
+    pointer = model_pointers_collection.find_one({'_id': _pointer_id(project)})
+    if pointer and pointer.get('model_id'):
+        return pointer['model_id']
+    return latest_model_id(project)
+
+def resolve_model_id(requested=None, project=DEFAULT_PROJECT):
+    """Requested model id (validated) or the project's active one; raises ValueError if malformed"""
+    if requested:
+        try:
+            return ObjectId(requested)
+        except Exception:
+            raise ValueError('Invalid model ID')
+    return active_model_id(project)
+
+def get_model(model_id, project=DEFAULT_PROJECT):
+    """(model, label encoder) for one of the project's models, loading it on a pool miss"""
+    def load():
+        model_doc = model_collection.find_one({'_id': model_id})
+        if not model_doc:
+            return None
+        model, le = load_model_doc(model_doc)
+        return model, le, model_doc.get('project') or DEFAULT_PROJECT
+
+    loaded = model_pool.get(str(model_id), load)
+    if loaded is None or loaded[2] != project:
+        return None
+    return loaded[0], loaded[1]
+
+def set_active_model(model_id, project=DEFAULT_PROJECT):
+    """Point the project at model_id, remembering the previous one for rollback"""
+    pointer = model_pointers_collection.find_one({'_id': _pointer_id(project)}) or {}
+    update = {'$set': {'model_id': model_id, 'updated_at': datetime.datetime.now()}}
+    previous = pointer.get('model_id')
+    if previous and previous != model_id:
+        update['$push'] = {'history': {'$each': [previous], '$slice': -MODEL_HISTORY_LENGTH}}
+    model_pointers_collection.update_one({'_id': _pointer_id(project)}, update, upsert=True)
+
+def load_model_doc(model_doc):
+    """Deserialize the Keras head and label encoder stored in a model document"""
+    # Load model and label encoder - FIX: Use temporary files
+    with tempfile.NamedTemporaryFile(suffix='.h5', delete=False) as model_file:
+        model_file.write(model_doc['model'])
+        model_file_path = model_file.name
+
+    with tempfile.NamedTemporaryFile(suffix='.pkl', delete=False) as le_file:
+        le_file.write(model_doc['label_encoder'])
+        le_file_path = le_file.name
+
+    try:
+        return tf.keras.models.load_model(model_file_path), joblib.load(le_file_path)
+    finally:
+        # Clean up temp files
+        os.unlink(model_file_path)
+        os.unlink(le_file_path)
+
+def scale_predictions(pred):
+    """Apply temperature scaling row by row"""
+    scaled_pred = np.exp(np.log(pred) / PREDICTION_TEMPERATURE)
+    return scaled_pred / np.sum(scaled_pred, axis=-1, keepdims=True)
+
+def stale_classes(classes, project):
+    """Classes a model predicts that the project has since deleted or renamed"""
+    current = {cls['name'] for cls in list_classes(project)[1]}
+    return sorted(str(cls) for cls in classes if str(cls) not in current)
+
+def stale_model_error(classes, project, allow_stale=False):
+    """409 response for a model that would predict missing classes, unless allowed"""
+    stale = stale_classes(classes, project)
+    if not stale or allow_stale:
+        return None
+    return jsonify({
+        'error': 'Model predicts classes that were deleted or renamed; retrain the '
+                 'project or pass allow_stale=true',
+        'stale_classes': stale
+    }), 409
+
+def _allow_stale(args):
+    return args.get('allow_stale', 'false').lower() == 'true'
+
+def format_prediction(classes, probabilities):
+    """Map class names to confidences, most likely first"""
+    results = {str(cls): float(conf) for cls, conf in zip(classes, probabilities)}
+    return dict(sorted(results.items(), key=lambda x: x[1], reverse=True))
+
+def _prepare_clip(audio_bytes):
+    """Look up a clip's embedding, decoding and validating it on a miss
+
+    Returns (digest, embedding, waveform, error).
+    """
+    digest = hashlib.sha256(audio_bytes).hexdigest()
+    embedding = embedding_cache.get(digest)
+    if embedding is not None:
+        return digest, embedding, None, None
+    try:
+        y, sr = librosa.load(io.BytesIO(audio_bytes), sr=SAMPLE_RATE, duration=1.5)
+    except Exception as e:
+        return digest, None, None, f"Invalid audio: {str(e)}"
+    is_valid, validation_msg = validate_waveform(y, sr)
+    if not is_valid:
+        return digest, None, None, validation_msg
+    return digest, None, fit_waveform(y, sr), None
+
+def _collect_batch_clips():
+    """(filename, bytes) for every uploaded file, expanding zip archives; returns
+    (clips, error)
+
+    Archive members are counted and their uncompressed sizes added up from
+    the zip directory before any of them is decompressed.
+    """
+    clips = []
+    count = total_bytes = 0
+    for upload in request.files.getlist('audio'):
+        data = upload.read()
+        if zipfile.is_zipfile(io.BytesIO(data)):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                members = [
+                    member for member in archive.infolist()
+                    if not member.is_dir() and not member.filename.startswith('__MACOSX/')
+                ]
+                count += len(members)
+                total_bytes += sum(member.file_size for member in members)
+                if count > MAX_BATCH_FILES:
+                    return None, f'Too many files (maximum {MAX_BATCH_FILES})'
+                if total_bytes > MAX_BATCH_BYTES:
+                    return None, f'Archives expand past {MAX_BATCH_BYTES} bytes'
+                # ZipExtFile stops at the declared size, so the check above holds
+                clips.extend((member.filename, archive.read(member)) for member in members)
+        else:
+            count += 1
+            if count > MAX_BATCH_FILES:
+                return None, f'Too many files (maximum {MAX_BATCH_FILES})'
+            clips.append((upload.filename, data))
+    return clips, None
+
 @app.route('/api/audio/predict', methods=['POST'])
 def predict():
-    """Make predictions on new audio samples"""
+    """Make predictions on new audio samples (multipart or raw PCM)
+
+    A model that predicts deleted or renamed classes gets a 409 unless
+    ``allow_stale=true``.
+    """
     try:
-        if 'audio' not in request.files:
+        waveform = None
+        if is_raw_pcm_request():
+            waveform, error = read_raw_pcm()
+            if error:
+                return jsonify({'error': error}), 400
+            audio_bytes = waveform.tobytes()
+        elif 'audio' not in request.files:
             return jsonify({'error': 'No audio file provided'}), 400
-            
-        audio_file = request.files['audio']
-        audio_bytes = audio_file.read()
-        
+        else:
+            audio_bytes = request.files['audio'].read()
+
+        project = request_project()
+        try:
+            model_id = resolve_model_id(
+                request.form.get('model_id') or request.args.get('model_id'), project
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if model_id is None:
+            return jsonify({'error': 'No trained model available'}), 400
+
+        # Replayed clips skip decode, YAMNet and the head entirely
+        digest = hashlib.sha256(audio_bytes).hexdigest()
+        # Keyed by project too: a model_id from another project must miss and
+        # then fail get_model's ownership check
+        cache_key = (project, digest, str(model_id), PREPROCESSING_VERSION)
+        allow_stale = _allow_stale(request.values)
+        cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            classes, probabilities = cached
+            return (stale_model_error(classes, project, allow_stale)
+                    or jsonify(format_prediction(classes, probabilities)))
+
         # Validate using in-memory processing
-        is_valid, validation_msg = validate_audio(audio_bytes)
+        if waveform is not None:
+            is_valid, validation_msg = validate_waveform(waveform)
+        else:
+            is_valid, validation_msg = validate_audio(audio_bytes)
         if not is_valid:
             return jsonify({'error': validation_msg}), 400
             
-        model_doc = model_collection.find_one(sort=[('timestamp', -1)])
-        if not model_doc:
-            return jsonify({'error': 'No trained model available'}), 400
-            
-        # Load model and label encoder - FIX: Use temporary files
-        with tempfile.NamedTemporaryFile(suffix='.h5', delete=False) as model_file:
-            model_file.write(model_doc['model'])
-            model_file_path = model_file.name
-        
-        with tempfile.NamedTemporaryFile(suffix='.pkl', delete=False) as le_file:
-            le_file.write(model_doc['label_encoder'])
-            le_file_path = le_file.name
-        
-        try:
-            # Load from temp files
-            model = tf.keras.models.load_model(model_file_path)
-            le = joblib.load(le_file_path)
-            
-            # Extract features and predict (all in memory)
+        loaded = get_model(model_id, project)
+        if loaded is None:
+            return jsonify({'error': 'Model not found'}), 404
+        model, le = loaded
+        stale_error = stale_model_error(le.classes_, project, allow_stale)
+        if stale_error:
+            return stale_error
+
+        # Extract features and predict (all in memory)
+        if waveform is not None:
+            embedding = embed_decoded(digest, waveform)
+        else:
             embedding = extract_embedding(audio_bytes)
-            if np.all(embedding == 0):
-                return jsonify({'error': 'Failed to extract audio features'}), 400
-                
-            pred = model.predict(np.expand_dims(embedding, axis=0), verbose=0)
-            
-            # Apply temperature scaling
-            temperature = 0.5
-            scaled_pred = np.exp(np.log(pred) / temperature)
-            scaled_pred = scaled_pred / np.sum(scaled_pred)
-            
-            # Format and return results
-            results = {
-                str(cls): float(conf) 
-                for cls, conf in zip(le.classes_, scaled_pred[0])
-            }
-            
-            return jsonify(dict(sorted(results.items(), key=lambda x: x[1], reverse=True)))
-        finally:
-            # Clean up temp files
-            os.unlink(model_file_path)
-            os.unlink(le_file_path)
+        if np.all(embedding == 0):
+            return jsonify({'error': 'Failed to extract audio features'}), 400
+
+        pred = model.predict(np.expand_dims(embedding, axis=0), verbose=0)
+        probabilities = scale_predictions(pred)[0]
+        prediction_cache.put(cache_key, (le.classes_.tolist(), probabilities))
+        return jsonify(format_prediction(le.classes_, probabilities))
             
     except Exception as e:
         print(f"Prediction error: {str(e)}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/audio/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for the in-process caches and model pool occupancy"""
+    return jsonify({
+        'predictions': prediction_cache.stats(),
+        'embeddings': embedding_cache.stats(),
+        'classes': class_list_cache.stats(),
+        'models': model_pool.stats(tenant_of=lambda loaded: loaded[2])
+    }), 200
+
+@app.route('/api/audio/models', methods=['GET'])
+def list_models():
+    """List the project's trained models (without their weights), newest first"""
+    try:
+        project = request_project()
+        active_id = active_model_id(project)
+        current_classes = set(classes_collection.distinct('name', project_filter(project)))
+        models = model_collection.find(
+            project_filter(project), {'model': 0, 'label_encoder': 0, 'search': 0}
+        ).sort('timestamp', -1)
+        return jsonify([{
+            '_id': str(doc['_id']),
+            'timestamp': doc['timestamp'],
+            'accuracy': doc.get('accuracy'),
+            'classes': doc.get('classes', []),
+            'config': doc.get('config'),
+            'active': doc['_id'] == active_id,
+            # Trained on a class set that has since been renamed, deleted or extended
+            'stale': set(doc.get('classes', [])) != current_classes
+        } for doc in models]), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/audio/models/<model_id>/promote', methods=['POST'])
+def promote_model(model_id):
+    """Serve a specific model version by default"""
+    try:
+        obj_id = ObjectId(model_id)
+    except:
+        return jsonify({'error': 'Invalid model ID'}), 400
+
+    try:
+        # Loading here also warms the pool so the switch is free at request time
+        project = request_project()
+        if get_model(obj_id, project) is None:
+            return jsonify({'error': 'Model not found'}), 404
+        set_active_model(obj_id, project)
+        return jsonify({'status': 'promoted', 'model_id': model_id}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/audio/models/rollback', methods=['POST'])
+def rollback_model():
+    """Go back to the previously active model"""
+    try:
+        project = request_project()
+        pointer = model_pointers_collection.find_one({'_id': _pointer_id(project)})
+        if not pointer or not pointer.get('history'):
+            return jsonify({'error': 'No previous model to roll back to'}), 400
+
+        previous = pointer['history'][-1]
+        result = model_pointers_collection.update_one(
+            {'_id': _pointer_id(project), 'model_id': pointer['model_id']},
+            {'$set': {'model_id': previous, 'updated_at': datetime.datetime.now()},
+             '$pop': {'history': 1}}
+        )
+        if result.modified_count == 0:
+            return jsonify({'error': 'Active model changed concurrently, retry'}), 409
+
+        get_model(previous, project)
+        return jsonify({'status': 'rolled back', 'model_id': str(previous)}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/audio/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score many clips (multipart files and/or zips) and stream NDJSON results
+
+    Each line is ``{"index", "filename", "predictions"}`` or ``{"index",
+    "filename", "error"}``. Clips decode in parallel and each chunk goes
+    through one batched YAMNet call and one batched head call, so lines
+    arrive chunk by chunk before the whole batch is done.
+    """
+    try:
+        clips, error = _collect_batch_clips()
+        if error:
+            return jsonify({'error': error}), 400
+        if not clips:
+            return jsonify({'error': 'No audio files provided'}), 400
+
+        project = request_project()
+        model_id = resolve_model_id(
+            request.form.get('model_id') or request.args.get('model_id'), project
+        )
+        if model_id is None:
+            return jsonify({'error': 'No trained model available'}), 400
+        loaded = get_model(model_id, project)
+        if loaded is None:
+            return jsonify({'error': 'Model not found'}), 404
+        model, le = loaded
+        stale_error = stale_model_error(le.classes_, project, _allow_stale(request.values))
+        if stale_error:
+            return stale_error
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Batch prediction error: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+    # Decoding of later chunks overlaps with inference on earlier ones
+    prepared = [_decode_pool.submit(_prepare_clip, audio_bytes) for _, audio_bytes in clips]
+
+    def generate():
+        for start in range(0, len(clips), BATCH_CHUNK_SIZE):
+            indices = range(start, min(start + BATCH_CHUNK_SIZE, len(clips)))
+            ready, embeddings, to_embed = [], {}, []
+            for index in indices:
+                digest, embedding, waveform, error = prepared[index].result()
+                if error:
+                    yield json.dumps({
+                        'index': index, 'filename': clips[index][0], 'error': error
+                    }) + '\n'
+                    continue
+                ready.append(index)
+                if embedding is not None:
+                    embeddings[index] = embedding
+                else:
+                    to_embed.append((index, digest, waveform))
+            if not ready:
+                continue
+
+            try:
+                # Only clips without a cached embedding go through YAMNet
+                if to_embed:
+                    computed = embed_batch(np.stack([w for _, _, w in to_embed]))
+                    for (index, digest, _), embedding in zip(to_embed, computed):
+                        embeddings[index] = embedding
+                        embedding_cache.put(digest, embedding)
+                probabilities = scale_predictions(model.predict(
+                    np.stack([embeddings[index] for index in ready]),
+                    batch_size=len(ready), verbose=0
+                ))
+            except Exception as e:
+                traceback.print_exc()
+                for index in ready:
+                    yield json.dumps({
+                        'index': index, 'filename': clips[index][0], 'error': str(e)
+                    }) + '\n'
+                continue
+
+            for index, row in zip(ready, probabilities):
+                yield json.dumps({
+                    'index': index,
+                    'filename': clips[index][0],
+                    'predictions': format_prediction(le.classes_, row)
+                }) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Inference Benchmark
+# Checks the CPU budget split: /predict latency should stay flat while a
+# training process fits on the training cores
+def _latency_summary(latencies):
+    if not latencies:
+        return {'requests': 0, 'p50_ms': None, 'p99_ms': None}
+    ms = np.asarray(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(float(np.percentile(ms, 50)), 1),
+        'p99_ms': round(float(np.percentile(ms, 99)), 1)
+    }
+
+def benchmark_inference(project=DEFAULT_PROJECT, requests=200, train_rows=5000, train_epochs=50):
+    """/predict latency on its own and while train_final fits a synthetic head
+
+    Every request sends fresh noise so neither the prediction nor the
+    embedding cache can answer it.
+    """
+    if active_model_id(project) is None:
+        raise ValueError(f"Project {project} has no active model to benchmark")
+    client = app.test_client()
+    rng = np.random.default_rng(0)
+
+    def timed_predict():
+        clip = (rng.standard_normal(SAMPLE_RATE) * 0.1).astype('<f4')
+        started = time.perf_counter()
+        response = client.post('/api/audio/predict', data=clip.tobytes(), headers={
+            'Content-Type': RAW_PCM_MIMETYPE, 'X-Project-Id': project
+        })
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict failed: {response.get_json().get('error')}")
+        return elapsed
+
+    idle = [timed_predict() for _ in range(requests)]
+
+    X = rng.standard_normal((train_rows, EMBEDDING_DIM)).astype(np.float32)
+    y = rng.integers(0, 2, train_rows)
+    busy = []
+    with tempfile.TemporaryDirectory() as workdir:
+        shared = share_matrix(X, y, workdir)
+        training = threading.Thread(target=train_final, args=(
+            shared, np.arange(train_rows), None, dict(DEFAULT_HEAD_CONFIG, epochs=train_epochs), None
+        ), daemon=True)
+        training.start()
+        # Only requests that overlap the fit count
+        while training.is_alive() and len(busy) < requests:
+            busy.append(timed_predict())
+        training.join()
+    return {'idle': _latency_summary(idle), 'training': _latency_summary(busy)}
+
+# Garbage Collection
+# Removes blobs no sample references (left behind by failed inserts or
+# interrupted deletes), GridFS chunks whose files document is gone (an
+# interrupted put or delete) and models outside the retention policy. Sweeps
+# resume from cursors saved in gc_state, so each run does bounded work.
+GC_GRACE = datetime.timedelta(hours=float(os.environ.get('AUDIO_GC_GRACE_HOURS', 24)))
+GC_BATCH_SIZE = int(os.environ.get('AUDIO_GC_BATCH_SIZE', 1000))
+GC_MAX_BATCHES = int(os.environ.get('AUDIO_GC_MAX_BATCHES', 10))
+MODEL_KEEP_LAST = int(os.environ.get('AUDIO_MODEL_KEEP_LAST', 10))
+MODEL_KEEP_DAYS = float(os.environ.get('AUDIO_MODEL_KEEP_DAYS', 0))
+
+def collect_orphan_blobs(store, max_batches=GC_MAX_BATCHES, batch_size=GC_BATCH_SIZE,
+                         grace=GC_GRACE, dry_run=False):
+    """Delete unreferenced blobs older than grace, continuing the last sweep"""
+    state_id = f"blobs:{store.name}"
+    state = gc_state_collection.find_one({'_id': state_id}) or {}
+    cursor = state.get('cursor')
+    # Blob stores report creation times in UTC
+    cutoff = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - grace
+    report = {'scanned': 0, 'orphaned': 0, 'reclaimed_bytes': 0, 'sweep_complete': False}
+
+    blobs = store.scan(after=cursor)
+    for _ in range(max_batches):
+        batch = list(itertools.islice(blobs, batch_size))
+        cursor = batch[-1][0] if batch else cursor
+        report['scanned'] += len(batch)
+
+        candidates = {blob_id: size for blob_id, size, created_at in batch if created_at < cutoff}
+        if candidates:
+            referenced = referenced_blobs(list(candidates))
+            orphans = [blob_id for blob_id in candidates if blob_id not in referenced]
+            report['orphaned'] += len(orphans)
+            report['reclaimed_bytes'] += sum(candidates[blob_id] for blob_id in orphans)
+            if orphans and not dry_run:
+                store.delete_many(orphans)
+
+        if len(batch) < batch_size:
+            # Reached the end; the next run starts a new sweep
+            cursor = None
+            report['sweep_complete'] = True
+            break
+
+    if not dry_run:
+        gc_state_collection.update_one(
+            {'_id': state_id},
+            {'$set': {'cursor': cursor, 'updated_at': datetime.datetime.now()}},
+            upsert=True
+        )
+    return report
+
+def collect_orphan_chunks(store, max_batches=GC_MAX_BATCHES, batch_size=GC_BATCH_SIZE,
+                          grace=GC_GRACE, dry_run=False):
+    """Delete GridFS chunks without a files document, continuing the last sweep.
+
+    A put writes its chunks before the files document, so only chunks
+    whose files_id is older than grace are treated as orphans.
+    """
+    state_id = f"chunks:{store.name}"
+    state = gc_state_collection.find_one({'_id': state_id}) or {}
+    cursor = state.get('cursor')
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - grace
+    report = {'scanned': 0, 'orphaned': 0, 'reclaimed_bytes': 0, 'sweep_complete': False}
+
+    owners = store.scan_chunk_owners(after=cursor)
+    for _ in range(max_batches):
+        batch = list(itertools.islice(owners, batch_size))
+        cursor = batch[-1] if batch else cursor
+        report['scanned'] += len(batch)
+
+        # files_id is the ObjectId allocated when the put started
+        candidates = [files_id for files_id in batch
+                      if isinstance(files_id, ObjectId) and files_id.generation_time < cutoff]
+        orphans = store.missing_files(candidates) if candidates else []
+        if orphans:
+            report['orphaned'] += len(orphans)
+            report['reclaimed_bytes'] += store.chunk_bytes(orphans)
+            if not dry_run:
+                store.delete_chunks(orphans)
+
+        if len(batch) < batch_size:
+            cursor = None
+            report['sweep_complete'] = True
+            break
+
+    if not dry_run:
+        gc_state_collection.update_one(
+            {'_id': state_id},
+            {'$set': {'cursor': cursor, 'updated_at': datetime.datetime.now()}},
+            upsert=True
+        )
+    return report
+
+def collect_models(keep_last=MODEL_KEEP_LAST, keep_days=MODEL_KEEP_DAYS, dry_run=False):
+    """Delete models that are neither among a project's newest keep_last nor
+    younger than keep_days; active models and rollback targets are always kept"""
+    protected = set()
+    for pointer in model_pointers_collection.find({}, {'model_id': 1, 'history': 1}):
+        if pointer.get('model_id'):
+            protected.add(pointer['model_id'])
+        protected.update(pointer.get('history', []))
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=keep_days) if keep_days else None
+
+    expired = []
+    for project in model_collection.distinct('project'):
+        older = model_collection.find(
+            project_filter(project), {'_id': 1, 'timestamp': 1}
+        ).sort('timestamp', -1).skip(max(1, keep_last))
+        for doc in older:
+            if doc['_id'] in protected:
+                continue
+            if cutoff and doc.get('timestamp') and doc['timestamp'] >= cutoff:
+                continue
+            expired.append(doc['_id'])
+
+    report = {'expired': len(expired), 'reclaimed_bytes': 0}
+    for start in range(0, len(expired), 100):
+        chunk = expired[start:start + 100]
+        sized = list(model_collection.aggregate([
+            {'$match': {'_id': {'$in': chunk}}},
+            {'$group': {'_id': None, 'bytes': {'$sum': {'$bsonSize': '$$ROOT'}}}}
+        ]))
+        report['reclaimed_bytes'] += sized[0]['bytes'] if sized else 0
+        if not dry_run:
+            model_collection.delete_many({'_id': {'$in': chunk}})
+            for model_id in chunk:
+                model_pool.discard(str(model_id))
+    return report
+
+def run_gc(max_batches=GC_MAX_BATCHES, dry_run=False):
+    """One bounded GC pass over every blob backend plus model retention"""
+    report = {
+        'blobs': {
+            store.name: collect_orphan_blobs(store, max_batches=max_batches, dry_run=dry_run)
+            for store in blob_store.stores
+        },
+        'chunks': {
+            store.name: collect_orphan_chunks(store, max_batches=max_batches, dry_run=dry_run)
+            for store in blob_store.stores if isinstance(store, GridFSBlobStore)
+        },
+        'models': collect_models(dry_run=dry_run),
+        'dry_run': dry_run
+    }
+    report['reclaimed_bytes'] = report['models']['reclaimed_bytes'] + sum(
+        sweep['reclaimed_bytes']
+        for sweeps in (report['blobs'], report['chunks']) for sweep in sweeps.values())
+    return report
+
+@app.route('/api/audio/gc', methods=['POST'])
+def garbage_collect():
+    """Run one GC pass; ``?dry_run=true`` only reports what would be reclaimed"""
+    try:
+        try:
+            max_batches = int(request.args.get('batches', GC_MAX_BATCHES))
+        except ValueError:
+            return jsonify({'error': 'batches must be an integer'}), 400
+        dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+        return jsonify(run_gc(max_batches=max_batches, dry_run=dry_run))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Streaming Classification
+# One YAMNet patch covers 0.975 s of audio (0.96 s plus STFT padding) and
+# patches advance by 0.48 s; each hop only embeds the newest patch
+STREAM_WINDOW = 15600
+STREAM_HOP = 7680
+STREAM_PATCHES_PER_CLIP = 2
+STREAM_MAX_BACKLOG_HOPS = int(os.environ.get('AUDIO_STREAM_MAX_BACKLOG_HOPS', 4))
+STREAM_MAX_MESSAGES_PER_READ = 64
+MAX_STREAMS = int(os.environ.get('AUDIO_MAX_STREAMS', 8))
+
+_stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+
+class StreamRingBuffer:
+    """Fixed-size float32 ring addressed by absolute stream sample position"""
+
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=np.float32)
+        self.end = 0
+
+    def write(self, samples):
+        capacity = len(self.data)
+        self.end += len(samples)
+        samples = samples[-capacity:]
+        start = (self.end - len(samples)) % capacity
+        first = min(len(samples), capacity - start)
+        self.data[start:start + first] = samples[:first]
+        self.data[:len(samples) - first] = samples[first:]
+
+    def read(self, stop, length):
+        """Samples [stop - length, stop); must still be inside the ring"""
+        capacity = len(self.data)
+        start = (stop - length) % capacity
+        if start + length <= capacity:
+            return self.data[start:start + length].copy()
+        return np.concatenate([self.data[start:], self.data[:start + length - capacity]])
+
+class StreamClassifier:
+    """Incremental per-connection classifier over hop-aligned YAMNet patches"""
+
+    def __init__(self, model, classes):
+        self.model = model
+        self.classes = classes
+        self.ring = StreamRingBuffer(STREAM_WINDOW + STREAM_HOP * (STREAM_MAX_BACKLOG_HOPS + 1))
+        self.next_window_end = STREAM_WINDOW
+        self.patches = deque(maxlen=STREAM_PATCHES_PER_CLIP)
+
+    def push(self, samples):
+        """Add PCM samples; returns one result per completed hop"""
+        self.ring.write(samples)
+        results = []
+        if self.ring.end < self.next_window_end:
+            return results
+
+        # Bound latency: when too far behind, skip ahead to the newest full window
+        behind = (self.ring.end - self.next_window_end) // STREAM_HOP
+        if behind > STREAM_MAX_BACKLOG_HOPS:
+            self.next_window_end += behind * STREAM_HOP
+            self.patches.clear()
+            results.append({'dropped_hops': int(behind)})
+
+        while self.next_window_end <= self.ring.end:
+            window = self.ring.read(self.next_window_end, STREAM_WINDOW)
+            _, embeddings, _ = get_yamnet()(tf.convert_to_tensor(window))
+            self.patches.append(embeddings.numpy()[0])
+
+            # Overlapping patches are reused, approximating a one-second clip embedding
+            embedding = np.mean(self.patches, axis=0, keepdims=True)
+            pred = self.model(embedding, training=False).numpy()
+            results.append({
+                'time': self.next_window_end / SAMPLE_RATE,
+                'predictions': format_prediction(self.classes, scale_predictions(pred)[0])
+            })
+            self.next_window_end += STREAM_HOP
+        return results
+
+def _decode_pcm_frame(message, dtype):
+    if isinstance(message, str):
+        raise ValueError('Expected binary PCM frames')
+    return decode_pcm(message, dtype)
+
+@sock.route('/api/audio/stream')
+def stream_predictions(ws):
+    """Classify raw 16 kHz mono PCM streamed over a WebSocket
+
+    Binary messages carry little-endian float32 samples (``?dtype=int16``
+    for 16-bit). A JSON message with class probabilities is sent for each
+    0.48 s hop.
+    """
+    if not _stream_slots.acquire(blocking=False):
+        ws.close(reason=1013, message='Too many concurrent streams')
+        return
+
+    try:
+        dtype = request.args.get('dtype', 'float32')
+        if dtype not in PCM_DTYPES:
+            ws.send(json.dumps({'error': 'dtype must be float32 or int16'}))
+            return
+        if int(request.args.get('sample_rate', SAMPLE_RATE)) != SAMPLE_RATE:
+            ws.send(json.dumps({'error': f'sample_rate must be {SAMPLE_RATE}'}))
+            return
+
+        project = request_project()
+        model_id = resolve_model_id(request.args.get('model_id'), project)
+        loaded = get_model(model_id, project) if model_id else None
+        if loaded is None:
+            ws.send(json.dumps({'error': 'No trained model available'}))
+            return
+        model, le = loaded
+        stale = stale_classes(le.classes_, project)
+        if stale and not _allow_stale(request.args):
+            ws.send(json.dumps({
+                'error': 'Model predicts classes that were deleted or renamed; retrain the '
+                         'project or pass allow_stale=true',
+                'stale_classes': stale
+            }))
+            return
+        classifier = StreamClassifier(model, le.classes_)
+
+        while True:
+            message = ws.receive()
+            if message is None:
+                break
+            # Drain whatever else already arrived so a slow consumer catches up in one step
+            frames = [_decode_pcm_frame(message, dtype)]
+            while len(frames) < STREAM_MAX_MESSAGES_PER_READ:
+                message = ws.receive(timeout=0)
+                if message is None:
+                    break
+                frames.append(_decode_pcm_frame(message, dtype))
+
+            for result in classifier.push(np.concatenate(frames)):
+                ws.send(json.dumps(result))
+    except ConnectionClosed:
+        pass
+    except Exception as e:
+        print(f"Streaming error: {str(e)}")
+        traceback.print_exc()
+        try:
+            ws.send(json.dumps({'error': str(e)}))
+        except ConnectionClosed:
+            pass
+    finally:
+        _stream_slots.release()
+
+# Bootstrap the schema on import so gunicorn workers get it too; spawned
+# training workers re-importing this file as __mp_main__ skip it
+if MIGRATE_ON_STARTUP and __name__ != '__mp_main__':
+    try:
+        run_migrations()
+    except Exception as e:
+        print(f"Schema migration failed: {str(e)}")
+        traceback.print_exc()
+
+# Pick up async uploads left unfinished by a previous process (the CLI
+# below does this itself, and only when serving)
+if __name__ not in ('__main__', '__mp_main__'):
+    try:
+        requeue_pending_samples()
+    except Exception as e:
+        print(f"Could not requeue pending samples: {str(e)}")
+
 # Main Execution
 if __name__ == '__main__':
-    initialize_database()
-    app.run(port=5001, debug=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Audio classification service')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('serve', help='Run the development server (default)')
+    subparsers.add_parser('migrate', help='Apply pending schema migrations')
+    check_parser = subparsers.add_parser(
+        'check-indexes', help='explain() hot queries and fail if any is not index-backed')
+    check_parser.add_argument('--project', default=DEFAULT_PROJECT)
+    import_parser = subparsers.add_parser(
+        'import', help='Bulk import a <class_name>/<file> directory or zip, or an export archive')
+    import_parser.add_argument('source')
+    import_parser.add_argument('--project', default=DEFAULT_PROJECT)
+    export_parser = subparsers.add_parser('export', help='Write a project export archive')
+    export_parser.add_argument('output')
+    export_parser.add_argument('--project', default=DEFAULT_PROJECT)
+    columnar_parser = subparsers.add_parser(
+        'export-embeddings', help='Write embeddings and metadata as Parquet or Arrow IPC')
+    columnar_parser.add_argument('output')
+    columnar_parser.add_argument('--project', default=DEFAULT_PROJECT)
+    columnar_parser.add_argument('--format', choices=sorted(COLUMNAR_FORMATS), default='parquet')
+    columnar_parser.add_argument('--class', dest='class_name')
+    bench_parser = subparsers.add_parser(
+        'bench-blobs', help='Compare GridFS and local blob store throughput')
+    bench_parser.add_argument('--count', type=int, default=200)
+    bench_parser.add_argument('--size', type=int, default=64 * 1024)
+    inference_parser = subparsers.add_parser(
+        'bench-inference', help='Compare /predict p50/p99 with and without a concurrent training fit')
+    inference_parser.add_argument('--project', default=DEFAULT_PROJECT)
+    inference_parser.add_argument('--requests', type=int, default=200)
+    inference_parser.add_argument('--train-rows', type=int, default=5000)
+    inference_parser.add_argument('--train-epochs', type=int, default=50)
+    gc_parser = subparsers.add_parser(
+        'gc', help='Delete orphaned audio blobs and models outside the retention policy')
+    gc_parser.add_argument('--batches', type=int, default=GC_MAX_BATCHES)
+    gc_parser.add_argument('--dry-run', action='store_true')
+    stats_parser = subparsers.add_parser(
+        'rebuild-stats', help='Recompute per-class statistics from the samples')
+    stats_parser.add_argument('--project', help='Only this project (default: all)')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        applied = run_migrations()
+        print(f"Applied {len(applied)} migration(s)")
+    elif args.command == 'check-indexes':
+        report = hot_query_plans(args.project)
+        for name, plan in report.items():
+            status = 'ok' if plan['covered'] else 'NOT COVERED'
+            print(f"{name:22} {status:12} {' > '.join(plan['stages'])}")
+        sys.exit(0 if all(plan['covered'] for plan in report.values()) else 1)
+    elif args.command == 'export':
+        with open(args.output, 'wb') as f:
+            manifest = write_archive(args.project, f)
+        print(f"Exported {manifest['samples']} sample(s) to {args.output}")
+    elif args.command == 'export-embeddings':
+        with open(args.output, 'wb') as f:
+            rows = write_columnar(args.project, f, args.format, args.class_name)
+        print(f"Wrote {rows} row(s) to {args.output}")
+    elif args.command == 'bench-blobs':
+        os.makedirs(BLOB_DIR, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix='bench-', dir=BLOB_DIR) as bench_dir:
+            stores = {'gridfs': GridFSBlobStore(db), 'local': LocalBlobStore(bench_dir)}
+            for name, store in stores.items():
+                for op, result in benchmark_blob_store(store, args.count, args.size).items():
+                    mb = f"{result['mb_per_second']} MB/s" if result['mb_per_second'] else ''
+                    print(f"{name:7} {op:7} {result['ops_per_second']:>10} ops/s  {mb}")
+    elif args.command == 'bench-inference':
+        report = benchmark_inference(args.project, args.requests, args.train_rows, args.train_epochs)
+        for phase, result in report.items():
+            print(f"{phase:9} {result['requests']:>5} requests  p50 {result['p50_ms']} ms  "
+                  f"p99 {result['p99_ms']} ms")
+        if report['training']['requests'] < args.requests:
+            print("Training finished before every request ran; raise --train-epochs for a fuller sample")
+    elif args.command == 'gc':
+        report = run_gc(max_batches=args.batches, dry_run=args.dry_run)
+        for name, blobs in report['blobs'].items():
+            print(f"{name} blobs: {blobs['scanned']} scanned, {blobs['orphaned']} orphaned, "
+                  f"{blobs['reclaimed_bytes']} bytes"
+                  + (' (sweep complete)' if blobs['sweep_complete'] else ''))
+        for name, chunks in report['chunks'].items():
+            print(f"{name} orphaned chunks: {chunks['scanned']} files_ids scanned, "
+                  f"{chunks['orphaned']} orphaned, {chunks['reclaimed_bytes']} bytes"
+                  + (' (sweep complete)' if chunks['sweep_complete'] else ''))
+        print(f"models: {report['models']['expired']} expired, "
+              f"{report['models']['reclaimed_bytes']} bytes")
+        print(f"{'Would reclaim' if args.dry_run else 'Reclaimed'} {report['reclaimed_bytes']} bytes")
+    elif args.command == 'rebuild-stats':
+        print(f"Rebuilt statistics for {rebuild_class_stats(args.project)} class(es)")
+    elif args.command == 'import':
+        def print_progress(job):
+            print(f"{job['processed']}/{job['total']} processed, {job['imported']} imported, "
+                  f"{job['skipped']} skipped, {job['failed']} failed")
+        job = run_import(args.source, args.project, progress=print_progress)
+        for failure in job['errors']:
+            print(f"  {failure['file']}: {failure['error']}")
+        if job['status'] != 'completed':
+            print(f"Import failed: {job.get('error')}")
+        sys.exit(0 if job['status'] == 'completed' else 1)
+    else:
+        requeue_pending_samples()
+        app.run(port=5001, debug=True)
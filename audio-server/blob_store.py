@@ -0,0 +1,339 @@
+"""Storage backends for sample audio.
+
+GridFSBlobStore keeps blobs in Mongo and is the default. LocalBlobStore is
+a content-addressed directory tree: blobs are named by their SHA-256,
+sharded two levels deep and written via an atomic rename, so playback can
+hand the file straight to send_file (sendfile under gunicorn) instead of
+reading chunks over the Mongo connection.
+
+GridFS ids are ObjectIds and local ids are hex digests, so BlobRouter can
+keep serving blobs written by a previous backend after switching.
+"""
+import os
+import re
+import time
+import datetime
+import hashlib
+import tempfile
+
+import gridfs
+from bson import ObjectId
+
+
+class BlobNotFound(KeyError):
+    """No blob with the given id"""
+
+
+class BlobStore:
+    """put/get/delete interface shared by the backends"""
+
+    name = None
+    # Identical uploads share one blob, so deletes must check for other users
+    content_addressed = False
+
+    def owns(self, blob_id):
+        raise NotImplementedError
+
+    def put(self, data, filename=None, content_type=None):
+        """Store bytes and return the blob id"""
+        raise NotImplementedError
+
+    def open(self, blob_id):
+        """Readable file object for a blob"""
+        raise NotImplementedError
+
+    def get(self, blob_id):
+        with self.open(blob_id) as f:
+            return f.read()
+
+    def size(self, blob_id):
+        raise NotImplementedError
+
+    def created_at(self, blob_id):
+        """When the blob was written (or last re-put, if content-addressed), naive UTC"""
+        raise NotImplementedError
+
+    def local_path(self, blob_id):
+        """Filesystem path that can be served directly, if the backend has one"""
+        return None
+
+    def delete(self, blob_id):
+        raise NotImplementedError
+
+    def delete_many(self, blob_ids):
+        for blob_id in blob_ids:
+            self.delete(blob_id)
+
+    def scan(self, after=None):
+        """Yield (blob_id, size, created_at) in id order, starting after a cursor.
+
+        created_at is a naive UTC datetime.
+        """
+        raise NotImplementedError
+
+
+class GridFSBlobStore(BlobStore):
+    name = 'gridfs'
+
+    def __init__(self, db, collection='fs'):
+        self.fs = gridfs.GridFS(db, collection)
+        self.files = db[f"{collection}.files"]
+        self.chunks = db[f"{collection}.chunks"]
+
+    def owns(self, blob_id):
+        return isinstance(blob_id, ObjectId)
+
+    def put(self, data, filename=None, content_type=None):
+        return self.fs.put(data, filename=filename, contentType=content_type)
+
+    def open(self, blob_id):
+        try:
+            return self.fs.get(blob_id)
+        except gridfs.errors.NoFile:
+            raise BlobNotFound(blob_id)
+
+    def size(self, blob_id):
+        return self.open(blob_id).length
+
+    def created_at(self, blob_id):
+        return self.open(blob_id).upload_date.replace(tzinfo=None)
+
+    def delete(self, blob_id):
+        self.fs.delete(blob_id)
+
+    def delete_many(self, blob_ids):
+        # Same order as GridFS.delete: hide the files, then drop their chunks
+        self.files.delete_many({'_id': {'$in': list(blob_ids)}})
+        self.chunks.delete_many({'files_id': {'$in': list(blob_ids)}})
+
+    def scan(self, after=None):
+        query = {'_id': {'$gt': after}} if after is not None else {}
+        cursor = self.files.find(query, {'length': 1, 'uploadDate': 1}).sort('_id', 1)
+        for doc in cursor:
+            yield doc['_id'], doc.get('length', 0), doc['uploadDate']
+
+    def scan_chunk_owners(self, after=None):
+        """Yield each distinct chunks.files_id in order, starting after a cursor.
+
+        Reads only the (files_id, n) index GridFS creates, so chunk data is
+        never fetched.
+        """
+        query = {'files_id': {'$gt': after}} if after is not None else {}
+        cursor = self.chunks.find(query, {'files_id': 1, '_id': 0}).sort(
+            [('files_id', 1), ('n', 1)])
+        previous = None
+        for doc in cursor:
+            if doc['files_id'] != previous:
+                previous = doc['files_id']
+                yield previous
+
+    def missing_files(self, files_ids):
+        """Subset of files_ids that have chunks but no files document"""
+        present = {doc['_id'] for doc in self.files.find({'_id': {'$in': list(files_ids)}},
+                                                         {'_id': 1})}
+        return [files_id for files_id in files_ids if files_id not in present]
+
+    def chunk_bytes(self, files_ids):
+        result = list(self.chunks.aggregate([
+            {'$match': {'files_id': {'$in': list(files_ids)}}},
+            {'$group': {'_id': None, 'bytes': {'$sum': {'$binarySize': '$data'}}}}
+        ]))
+        return result[0]['bytes'] if result else 0
+
+    def delete_chunks(self, files_ids):
+        self.chunks.delete_many({'files_id': {'$in': list(files_ids)}})
+
+
+class LocalBlobStore(BlobStore):
+    name = 'local'
+    content_addressed = True
+
+    _ID = re.compile(r'[0-9a-f]{64}')
+
+    def __init__(self, root):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def owns(self, blob_id):
+        return isinstance(blob_id, str) and bool(self._ID.fullmatch(blob_id))
+
+    def path(self, blob_id):
+        if not self.owns(blob_id):
+            raise BlobNotFound(blob_id)
+        return os.path.join(self.root, blob_id[:2], blob_id[2:4], blob_id)
+
+    def put(self, data, filename=None, content_type=None):
+        blob_id = hashlib.sha256(data).hexdigest()
+        path = self.path(blob_id)
+        try:
+            # Refresh the mtime so garbage collection and release_blob treat it as new
+            os.utime(path)
+            return blob_id
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return blob_id
+
+    def open(self, blob_id):
+        try:
+            return open(self.path(blob_id), 'rb')
+        except FileNotFoundError:
+            raise BlobNotFound(blob_id)
+
+    def size(self, blob_id):
+        try:
+            return os.path.getsize(self.path(blob_id))
+        except FileNotFoundError:
+            raise BlobNotFound(blob_id)
+
+    def created_at(self, blob_id):
+        try:
+            mtime = os.path.getmtime(self.path(blob_id))
+        except FileNotFoundError:
+            raise BlobNotFound(blob_id)
+        return datetime.datetime.fromtimestamp(mtime, datetime.timezone.utc).replace(tzinfo=None)
+
+    def local_path(self, blob_id):
+        path = self.path(blob_id)
+        return path if os.path.exists(path) else None
+
+    def delete(self, blob_id):
+        try:
+            os.remove(self.path(blob_id))
+        except FileNotFoundError:
+            pass
+
+    def _sorted_dirs(self, path, length):
+        try:
+            return sorted(name for name in os.listdir(path)
+                          if len(name) == length and os.path.isdir(os.path.join(path, name)))
+        except FileNotFoundError:
+            return []
+
+    def scan(self, after=None):
+        after = after or ''
+        for shard in self._sorted_dirs(self.root, 2):
+            if shard < after[:2]:
+                continue
+            shard_dir = os.path.join(self.root, shard)
+            for sub in self._sorted_dirs(shard_dir, 2):
+                if shard + sub < after[:4]:
+                    continue
+                sub_dir = os.path.join(shard_dir, sub)
+                for blob_id in sorted(os.listdir(sub_dir)):
+                    if not self.owns(blob_id) or blob_id <= after:
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(sub_dir, blob_id))
+                    except FileNotFoundError:
+                        continue
+                    created_at = datetime.datetime.fromtimestamp(
+                        stat.st_mtime, datetime.timezone.utc).replace(tzinfo=None)
+                    yield blob_id, stat.st_size, created_at
+
+
+class BlobRouter(BlobStore):
+    """Writes to one backend and reads/deletes through whichever owns the id"""
+
+    def __init__(self, primary, *fallbacks):
+        self.primary = primary
+        self.stores = (primary,) + fallbacks
+        self.content_addressed = any(store.content_addressed for store in self.stores)
+
+    def store_for(self, blob_id):
+        for store in self.stores:
+            if store.owns(blob_id):
+                return store
+        raise BlobNotFound(blob_id)
+
+    def owns(self, blob_id):
+        return any(store.owns(blob_id) for store in self.stores)
+
+    def is_shared(self, blob_id):
+        return self.store_for(blob_id).content_addressed
+
+    def put(self, data, filename=None, content_type=None):
+        return self.primary.put(data, filename=filename, content_type=content_type)
+
+    def open(self, blob_id):
+        return self.store_for(blob_id).open(blob_id)
+
+    def get(self, blob_id):
+        return self.store_for(blob_id).get(blob_id)
+
+    def size(self, blob_id):
+        return self.store_for(blob_id).size(blob_id)
+
+    def created_at(self, blob_id):
+        return self.store_for(blob_id).created_at(blob_id)
+
+    def local_path(self, blob_id):
+        return self.store_for(blob_id).local_path(blob_id)
+
+    def delete(self, blob_id):
+        self.store_for(blob_id).delete(blob_id)
+
+    def delete_many(self, blob_ids):
+        by_store = {}
+        for blob_id in blob_ids:
+            by_store.setdefault(self.store_for(blob_id), []).append(blob_id)
+        for store, store_ids in by_store.items():
+            store.delete_many(store_ids)
+
+
+def open_blob_store(db, backend='gridfs', root=None):
+    """Blob store for the configured backend, still able to read GridFS blobs"""
+    gridfs_store = GridFSBlobStore(db)
+    if backend == 'gridfs':
+        return BlobRouter(gridfs_store)
+    if backend == 'local':
+        return BlobRouter(LocalBlobStore(root), gridfs_store)
+    raise ValueError(f"Unknown blob store backend: {backend}")
+
+
+def benchmark(store, count=200, size=64 * 1024):
+    """Time put, get, size and delete of random blobs; returns ops/second and MB/s"""
+    data = [os.urandom(size) for _ in range(count)]
+    results = {}
+
+    started = time.perf_counter()
+    blob_ids = [store.put(blob, filename=f"bench-{i}.bin") for i, blob in enumerate(data)]
+    results['put'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for blob_id in blob_ids:
+        store.get(blob_id)
+    results['get'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for blob_id in blob_ids:
+        store.size(blob_id)
+    results['size'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for blob_id in blob_ids:
+        store.delete(blob_id)
+    results['delete'] = time.perf_counter() - started
+
+    megabytes = count * size / (1024 * 1024)
+    return {
+        op: {
+            'ops_per_second': round(count / seconds, 1) if seconds else None,
+            'mb_per_second': round(megabytes / seconds, 1) if seconds and op in ('put', 'get')
+            else None
+        }
+        for op, seconds in results.items()
+    }
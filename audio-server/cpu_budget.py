@@ -0,0 +1,128 @@
+"""CPU thread budgets for the inference (Flask) and training processes.
+
+Each role reads its knobs from the environment:
+
+    AUDIO_<ROLE>_CPUS               affinity list such as "0-1" or "0,2,4"
+    AUDIO_<ROLE>_THREADS            OpenMP/MKL/OpenBLAS/numba threads
+    AUDIO_<ROLE>_INTRA_OP_THREADS   TensorFlow intra-op pool
+    AUDIO_<ROLE>_INTER_OP_THREADS   TensorFlow inter-op pool
+
+where ROLE is INFERENCE or TRAIN. Without overrides, hosts with four or
+more cores keep a quarter of them for inference and give the rest to
+training so a running fit cannot starve /predict.
+
+This module must not import numpy or TensorFlow at import time:
+apply_env() only works if it runs before they are loaded.
+"""
+import os
+
+ROLES = ('inference', 'train')
+
+_NATIVE_THREAD_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+
+def _host_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+_HOST_CPUS = _host_cpus()
+
+
+def parse_cpu_list(value):
+    """Parse "0-3,6" into [0, 1, 2, 3, 6]"""
+    cpus = []
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return sorted(set(cpus))
+
+
+def _default_cpus(role):
+    if len(_HOST_CPUS) < 4:
+        return list(_HOST_CPUS)
+    reserved = max(1, len(_HOST_CPUS) // 4)
+    return _HOST_CPUS[:reserved] if role == 'inference' else _HOST_CPUS[reserved:]
+
+
+def budget_for(role):
+    """Resolved thread/affinity budget for a role"""
+    if role not in ROLES:
+        raise ValueError(f"Unknown CPU budget role: {role}")
+    prefix = f"AUDIO_{role.upper()}_"
+    cpus_value = os.environ.get(prefix + 'CPUS')
+    cpus = parse_cpu_list(cpus_value) if cpus_value else _default_cpus(role)
+    threads = int(os.environ.get(prefix + 'THREADS', len(cpus)))
+    return {
+        'cpus': cpus,
+        'threads': threads,
+        'intra_op_threads': int(os.environ.get(prefix + 'INTRA_OP_THREADS', threads)),
+        'inter_op_threads': int(os.environ.get(prefix + 'INTER_OP_THREADS', 2))
+    }
+
+
+def cores_for(role):
+    """Number of cores a role may use"""
+    return len(budget_for(role)['cpus'])
+
+
+def _set_affinity(cpus):
+    if hasattr(os, 'sched_setaffinity') and cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            print(f"Could not set CPU affinity {cpus}: {e}")
+
+
+def apply_env(role):
+    """Set native thread-pool variables and affinity; call before importing numpy"""
+    budget = budget_for(role)
+    for name in _NATIVE_THREAD_VARS:
+        os.environ.setdefault(name, str(budget['threads']))
+    # numba can only lower its pool at runtime, so size it for the larger role
+    os.environ.setdefault(
+        'NUMBA_NUM_THREADS', str(max(budget_for(r)['threads'] for r in ROLES))
+    )
+    _set_affinity(budget['cpus'])
+    return budget
+
+
+def apply_runtime(role, intra_op_threads=None, inter_op_threads=None):
+    """Apply a role's budget in a process where numpy/TF may already be loaded.
+
+    TensorFlow pools can only be sized before the first op runs; later
+    calls leave them unchanged.
+    """
+    budget = budget_for(role)
+    if intra_op_threads is not None:
+        budget['intra_op_threads'] = intra_op_threads
+    if inter_op_threads is not None:
+        budget['inter_op_threads'] = inter_op_threads
+    _set_affinity(budget['cpus'])
+
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=budget['threads'])
+    except ImportError:
+        pass
+
+    try:
+        import numba
+        numba.set_num_threads(min(budget['threads'], numba.config.NUMBA_NUM_THREADS))
+    except ImportError:
+        pass
+
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(budget['intra_op_threads'])
+        tf.config.threading.set_inter_op_parallelism_threads(budget['inter_op_threads'])
+    except RuntimeError:
+        print(f"TensorFlow already initialized; {role} thread pools left unchanged")
+    return budget
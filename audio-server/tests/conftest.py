@@ -0,0 +1,18 @@
+"""Point audio_model at a throwaway database before it is imported.
+
+Set AUDIO_MONGO_URI to run the Mongo-backed tests against a server other
+than localhost; they are skipped when none is reachable.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+_workdir = tempfile.mkdtemp(prefix='audio-tests-')
+os.environ.setdefault('AUDIO_MONGO_URI', 'mongodb://localhost:27017/?serverSelectionTimeoutMS=1000')
+os.environ['AUDIO_MONGO_DB'] = f"audio_test_{uuid.uuid4().hex[:12]}"
+os.environ['AUDIO_MIGRATE_ON_STARTUP'] = 'false'
+os.environ['AUDIO_SNAPSHOT_DIR'] = os.path.join(_workdir, 'snapshot')
+os.environ['AUDIO_BLOB_DIR'] = os.path.join(_workdir, 'blobs')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
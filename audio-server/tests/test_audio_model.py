@@ -0,0 +1,117 @@
+import datetime
+import hashlib
+import io
+import tarfile
+import zipfile
+
+import numpy as np
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+
+import audio_model
+
+
+@pytest.fixture(scope='module')
+def mongo():
+    try:
+        audio_model.client.admin.command('ping')
+    except ServerSelectionTimeoutError:
+        pytest.skip('No MongoDB server reachable at AUDIO_MONGO_URI')
+    yield audio_model.db
+    audio_model.client.drop_database(audio_model.db.name)
+
+
+def test_module_imports():
+    rules = {rule.rule for rule in audio_model.app.url_map.iter_rules()}
+    assert '/api/audio/classes' in rules
+    assert '/api/audio/predict' in rules
+
+
+def test_migrations_apply_once(mongo):
+    applied = audio_model.run_migrations()
+    assert applied == [version for version, _, _ in audio_model.MIGRATIONS]
+    assert audio_model.run_migrations() == []
+
+
+def test_hot_queries_are_index_backed(mongo):
+    audio_model.run_migrations()
+    report = audio_model.hot_query_plans()
+    uncovered = {name: plan['stages'] for name, plan in report.items() if not plan['covered']}
+    assert not uncovered
+
+
+def _one_clip_tar(path):
+    """Tar laid out like an export of a single sample"""
+    workdir = path.parent
+    np.savez(workdir / 'embeddings.npz', embeddings=np.zeros((1, 1024), dtype=np.float32))
+    (workdir / 'samples.jsonl').write_text('{}\n')
+    with tarfile.open(path, 'w') as tar:
+        tar.add(workdir / 'samples.jsonl', arcname='samples.jsonl')
+        tar.add(workdir / 'embeddings.npz', arcname='embeddings.npz')
+
+
+def test_small_export_is_detected_as_tar(tmp_path):
+    archive = tmp_path / 'export.tar'
+    _one_clip_tar(archive)
+    # The trailing npz makes the tar look like a zip too
+    assert zipfile.is_zipfile(archive)
+    assert audio_model.archive_kind(str(archive)) == 'tar'
+
+
+def test_one_sample_export_round_trips(mongo, tmp_path):
+    audio_bytes = audio_model.encode_wav(
+        0.1 * np.sin(np.arange(audio_model.SAMPLE_RATE) / 5.0).astype(np.float32))
+    now = datetime.datetime.now()
+    audio_model.classes_collection.insert_one(
+        {'name': 'tone', 'project': 'export-src', 'created_at': now})
+    audio_model.audio_collection.insert_one({
+        'class': 'tone',
+        'project': 'export-src',
+        'content_hash': hashlib.sha256(audio_bytes).hexdigest(),
+        'timestamp': now,
+        'filename': 'tone.wav',
+        'file_id': audio_model.blob_store.put(audio_bytes, filename='tone.wav'),
+        'content_type': 'audio/wav',
+        'size': len(audio_bytes),
+        'embedding': [0.5] * audio_model.EMBEDDING_DIM,
+        'status': 'ready',
+        'ready_at': now
+    })
+
+    archive = tmp_path / 'export.tar'
+    with open(archive, 'wb') as f:
+        audio_model.write_archive('export-src', f)
+    job = audio_model.run_import(str(archive), 'export-dst')
+
+    assert job['status'] == 'completed'
+    assert job['imported'] == 1
+    restored = audio_model.audio_collection.find_one({'project': 'export-dst'})
+    assert restored['class'] == 'tone'
+    assert audio_model.blob_store.get(restored['file_id'])
+
+
+@pytest.mark.parametrize('search', [
+    {'trials': '5'}, {'trials': 0}, {'trials': True}, {'time_budget': 'x'}, {'time_budget': -1}
+])
+def test_train_rejects_bad_search_options(search):
+    with audio_model.app.test_request_context(
+        '/api/audio/train', method='POST', json={'search': search}
+    ):
+        response, status = audio_model.train_model()
+    assert status == 400
+    assert 'search' in response.get_json()['error']
+
+
+def test_batch_zip_limits_are_checked_before_reading(monkeypatch):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for i in range(3):
+            zf.writestr(f'{i}.wav', b'\0' * 1000)
+    monkeypatch.setattr(audio_model, 'MAX_BATCH_BYTES', 2000)
+    monkeypatch.setattr(zipfile.ZipFile, 'read', lambda *args: pytest.fail('member read'))
+    with audio_model.app.test_request_context('/api/audio/predict/batch', method='POST', data={
+        'audio': (io.BytesIO(archive.getvalue()), 'clips.zip')
+    }):
+        clips, error = audio_model._collect_batch_clips()
+    assert clips is None
+    assert 'expand past' in error
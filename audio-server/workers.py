@@ -0,0 +1,462 @@
+"""Training, bulk-import and background-ingest jobs that run in worker processes.
+
+Kept free of the Flask app and Mongo client, and YAMNet is only loaded by
+the embedder, so spawned children only pay for importing TensorFlow
+and librosa. Every pool runs under the "train" CPU budget from cpu_budget,
+leaving the inference cores alone.
+"""
+import io
+import os
+import hashlib
+import tempfile
+import time
+import random
+import threading
+import itertools
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, as_completed
+import multiprocessing
+
+import librosa
+import numpy as np
+import soundfile as sf
+import tensorflow as tf
+import tensorflow_hub as hub
+from sklearn.metrics import confusion_matrix
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from tensorflow.keras.models import Sequential
+from tensorflow.keras.layers import Dense, Dropout, Input, BatchNormalization
+
+import cpu_budget
+
+SAMPLE_RATE = 16000
+YAMNET_URL = "https://tfhub.dev/google/yamnet/1"
+
+DEFAULT_HEAD_CONFIG = {
+    'learning_rate': 0.001,
+    'units': [512, 256],
+    'dropout': 0.5,
+    'batch_size': 32,
+    'epochs': 50
+}
+
+SEARCH_SPACE = {
+    'learning_rate': [0.0003, 0.001, 0.003],
+    'units': [[256, 128], [512, 256], [1024, 256]],
+    'dropout': [0.3, 0.5],
+    'batch_size': [16, 32]
+}
+
+# Populated in each worker by _init_worker
+_shared = {}
+
+
+def available_cores():
+    """Number of cores the training budget may run on"""
+    return max(1, cpu_budget.cores_for('train'))
+
+
+def validate_waveform(y, sr=SAMPLE_RATE):
+    """Check that decoded audio is long and loud enough to classify"""
+    if len(y) < sr * 0.5:
+        return False, "Audio too short (minimum 0.5 second)"
+
+    rms = librosa.feature.rms(y=y)
+    if np.mean(rms) < 0.005:
+        return False, "Audio too quiet"
+
+    return True, ""
+
+
+def fit_waveform(y, sr=SAMPLE_RATE):
+    """Trim or zero-pad to the one-second window embeddings are computed on"""
+    y = np.asarray(y[:sr], dtype=np.float32)
+    if len(y) < sr:
+        y = np.pad(y, (0, sr - len(y)))
+    return y
+
+
+def build_model(input_dim, num_classes, config):
+    """Build and compile the classification head for a given config"""
+    layers = [Input(shape=(input_dim,))]
+    for units in config['units']:
+        layers += [
+            Dense(units, activation='relu', kernel_regularizer='l2'),
+            Dropout(config['dropout']),
+            BatchNormalization()
+        ]
+    layers.append(Dense(num_classes, activation='softmax'))
+
+    model = Sequential(layers)
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=config['learning_rate']),
+        loss='sparse_categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    return model
+
+
+class DeadlineCallback(tf.keras.callbacks.Callback):
+    """Stop training at the end of the epoch that crosses a wall-clock deadline"""
+
+    def __init__(self, deadline):
+        super().__init__()
+        self.deadline = deadline
+        self.hit = False
+
+    def on_epoch_end(self, epoch, logs=None):
+        if time.time() >= self.deadline:
+            self.hit = True
+            self.model.stop_training = True
+
+
+def fit_model(model, X_train, y_train, X_val, y_val, config, class_weight,
+              deadline=None, verbose=2):
+    """Fit a head; returns (history, stopped_by_deadline).
+
+    Early stopping only applies when validation data is given.
+    """
+    callbacks = []
+    if X_val is not None:
+        callbacks.append(tf.keras.callbacks.EarlyStopping(patience=5, restore_best_weights=True))
+    deadline_callback = None
+    if deadline is not None:
+        deadline_callback = DeadlineCallback(deadline)
+        callbacks.append(deadline_callback)
+
+    history = model.fit(
+        X_train, y_train,
+        epochs=config['epochs'],
+        batch_size=config['batch_size'],
+        validation_data=(X_val, y_val) if X_val is not None else None,
+        class_weight=class_weight,
+        callbacks=callbacks,
+        verbose=verbose
+    )
+    return history, bool(deadline_callback and deadline_callback.hit)
+
+
+def search_configs(mode='random', trials=None, seed=42):
+    """Expand SEARCH_SPACE into a list of head configs"""
+    keys = list(SEARCH_SPACE)
+    grid = [
+        dict(DEFAULT_HEAD_CONFIG, **dict(zip(keys, values)))
+        for values in itertools.product(*(SEARCH_SPACE[key] for key in keys))
+    ]
+    if mode == 'grid':
+        return grid[:trials] if trials else grid
+    if mode != 'random':
+        raise ValueError(f"Unknown search mode: {mode}")
+    rng = random.Random(seed)
+    return rng.sample(grid, min(trials or 8, len(grid)))
+
+
+def share_matrix(X, y, workdir):
+    """Write X/y once so every worker can memory-map the same pages"""
+    matrix_path = os.path.join(workdir, 'X.npy')
+    labels_path = os.path.join(workdir, 'y.npy')
+    np.save(matrix_path, np.ascontiguousarray(X, dtype=np.float32))
+    np.save(labels_path, np.asarray(y))
+    return matrix_path, labels_path, None
+
+
+def share_rows(matrix_path, rows, y, workdir):
+    """Share selected rows of an existing .npy matrix without copying it.
+
+    Workers memory-map matrix_path and read row ``rows[i]`` for sample i,
+    so the file must not change under those rows while they run.
+    """
+    labels_path = os.path.join(workdir, 'y.npy')
+    rows_path = os.path.join(workdir, 'rows.npy')
+    np.save(labels_path, np.asarray(y))
+    np.save(rows_path, np.asarray(rows, dtype=np.int64))
+    return matrix_path, labels_path, rows_path
+
+
+def _init_worker(shared, intra_op_threads, inter_op_threads):
+    """Apply the training CPU budget and open the shared matrix once per worker"""
+    cpu_budget.apply_runtime('train', intra_op_threads=intra_op_threads,
+                             inter_op_threads=inter_op_threads)
+    tf.get_logger().setLevel('ERROR')
+    matrix_path, labels_path, rows_path = shared
+    _shared['X'] = np.load(matrix_path, mmap_mode='r')
+    _shared['y'] = np.load(labels_path, mmap_mode='r')
+    _shared['rows'] = np.load(rows_path) if rows_path else None
+
+
+def _rows(indices):
+    """Matrix rows holding the given samples"""
+    rows = _shared['rows']
+    return indices if rows is None else rows[indices]
+
+
+def _start_pool(shared, max_workers, intra_op_threads, inter_op_threads=1):
+    """Process pool over the shared matrix; concurrent workers get one inter-op
+    thread each unless told otherwise (None keeps the training budget's)"""
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(shared, intra_op_threads, inter_op_threads)
+    )
+
+
+def _run_trial(config, train_idx, val_idx, class_weight, deadline):
+    """Train one config on the shared matrix and report validation metrics"""
+    started = time.time()
+    X, y = _shared['X'], _shared['y']
+    num_classes = int(np.max(y)) + 1
+    model = build_model(X.shape[1], num_classes, config)
+    history, stopped = fit_model(
+        model, X[_rows(train_idx)], y[train_idx], X[_rows(val_idx)], y[val_idx],
+        config, class_weight, deadline=deadline, verbose=0
+    )
+    val_loss, val_accuracy = model.evaluate(X[_rows(val_idx)], y[val_idx], verbose=0)
+    return {
+        'config': config,
+        'val_accuracy': float(val_accuracy),
+        'val_loss': float(val_loss),
+        'epochs': len(history.history['loss']),
+        'seconds': round(time.time() - started, 2),
+        'stopped_by_budget': stopped
+    }
+
+
+def run_search(shared, train_idx, val_idx, configs, class_weight, time_budget,
+               max_workers=None):
+    """Evaluate configs in a process pool until done or the time budget runs out.
+
+    Returns the leaderboard sorted best-first; trials that never started
+    before the deadline are left out.
+    """
+    max_workers = max(1, min(max_workers or available_cores(), len(configs)))
+    deadline = time.time() + time_budget
+    results = []
+    executor = _start_pool(shared, max_workers, 1)
+    try:
+        futures = [
+            executor.submit(_run_trial, config, train_idx, val_idx, class_weight, deadline)
+            for config in configs
+        ]
+        collected = set()
+        try:
+            for future in as_completed(futures, timeout=max(0, deadline - time.time())):
+                collected.add(future)
+                results.append(future.result())
+        except TimeoutError:
+            # Running trials stop at their next epoch boundary; queued ones are dropped
+            executor.shutdown(wait=True, cancel_futures=True)
+            results.extend(
+                future.result() for future in futures
+                if future not in collected and future.done() and not future.cancelled()
+            )
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return sorted(results, key=lambda r: (-r['val_accuracy'], r['val_loss']))
+
+
+def _early_stopping_split(train_idx, y, fraction=0.1):
+    """Carve an early-stopping set out of a fold's training indices.
+
+    Stratified when every class can spare a sample, shuffled otherwise.
+    """
+    try:
+        return train_test_split(train_idx, test_size=fraction, random_state=42,
+                                stratify=y[train_idx])
+    except ValueError:
+        return train_test_split(train_idx, test_size=fraction, random_state=42)
+
+
+def _run_fold(config, train_idx, val_idx, class_weight):
+    """Train on one fold and predict its held-out samples.
+
+    Early stopping watches a split of the fold's training data, so the
+    held-out samples only ever score the finished model.
+    """
+    X, y = _shared['X'], _shared['y']
+    num_classes = int(np.max(y)) + 1
+    model = build_model(X.shape[1], num_classes, config)
+    fit_idx, stop_idx = _early_stopping_split(train_idx, y)
+    history, _ = fit_model(
+        model, X[_rows(fit_idx)], y[fit_idx], X[_rows(stop_idx)], y[stop_idx],
+        config, class_weight, verbose=0
+    )
+    predictions = np.argmax(model.predict(X[_rows(val_idx)], verbose=0), axis=1)
+    return {
+        'val_idx': val_idx,
+        'predictions': predictions,
+        'accuracy': float(np.mean(predictions == y[val_idx])),
+        'best_epoch': int(np.argmin(history.history['val_loss'])) + 1
+    }
+
+
+def run_cross_validation(shared, y, config, class_weight, folds, max_workers=None):
+    """Stratified k-fold CV with one fold per worker process.
+
+    The fold count is capped by the smallest class. Each worker gets an
+    equal share of the training cores as TF intra-op threads so folds never
+    oversubscribe the machine.
+    """
+    y = np.asarray(y)
+    smallest_class = int(np.min(np.bincount(y)))
+    folds = min(folds, smallest_class)
+    if folds < 2:
+        raise ValueError('Cross-validation needs at least 2 samples in every class')
+
+    cores = available_cores()
+    max_workers = max(1, min(max_workers or cores, folds))
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=42)
+    executor = _start_pool(shared, max_workers, max(1, cores // max_workers))
+    try:
+        futures = [
+            executor.submit(_run_fold, config, train_idx, val_idx, class_weight)
+            for train_idx, val_idx in splitter.split(np.zeros(len(y)), y)
+        ]
+        results = [future.result() for future in futures]
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    predictions = np.empty(len(y), dtype=y.dtype)
+    for result in results:
+        predictions[result['val_idx']] = result['predictions']
+    accuracies = [result['accuracy'] for result in results]
+    return {
+        'folds': folds,
+        'accuracies': accuracies,
+        'mean_accuracy': float(np.mean(accuracies)),
+        'std_accuracy': float(np.std(accuracies)),
+        'confusion_matrix': confusion_matrix(
+            y, predictions, labels=np.arange(int(np.max(y)) + 1)
+        ).tolist(),
+        'best_epochs': [result['best_epoch'] for result in results]
+    }
+
+
+def _run_final(config, train_idx, val_idx, class_weight):
+    """Train the production head and return it serialized as .h5 bytes"""
+    X, y = _shared['X'], _shared['y']
+    num_classes = int(np.max(y)) + 1
+    model = build_model(X.shape[1], num_classes, config)
+    if val_idx is None:
+        history, _ = fit_model(
+            model, X[_rows(train_idx)], y[train_idx], None, None, config, class_weight
+        )
+    else:
+        history, _ = fit_model(
+            model, X[_rows(train_idx)], y[train_idx], X[_rows(val_idx)], y[val_idx],
+            config, class_weight
+        )
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        model_path = os.path.join(tmpdir, 'model.h5')
+        model.save(model_path)
+        with open(model_path, 'rb') as f:
+            model_bytes = f.read()
+    return model_bytes, {key: [float(v) for v in values]
+                         for key, values in history.history.items()}
+
+
+def train_final(shared, train_idx, val_idx, config, class_weight):
+    """Fit the final model in a separate training process.
+
+    Keeps model.fit off the Flask worker so it runs on the training cores.
+    Pass val_idx=None to train on train_idx without early stopping.
+    """
+    executor = _start_pool(shared, 1, None, None)
+    try:
+        return executor.submit(
+            _run_final, config, train_idx, val_idx, class_weight
+        ).result()
+    finally:
+        executor.shutdown(wait=True)
+
+
+def _init_decoder():
+    cpu_budget.apply_runtime('train', intra_op_threads=1)
+
+
+def decode_file(path):
+    """Read, hash, decode and validate one clip for bulk import.
+
+    Returns (waveform, error, content_hash, duration); waveform is None
+    when the clip is rejected.
+    """
+    with open(path, 'rb') as f:
+        audio_bytes = f.read()
+    digest = hashlib.sha256(audio_bytes).hexdigest()
+    try:
+        y, sr = librosa.load(io.BytesIO(audio_bytes), sr=SAMPLE_RATE, duration=1.5)
+    except Exception as e:
+        return None, f"Invalid audio: {str(e)}", digest, None
+
+    is_valid, validation_msg = validate_waveform(y, sr)
+    if not is_valid:
+        return None, validation_msg, digest, None
+    try:
+        duration = sf.info(io.BytesIO(audio_bytes)).duration
+    except Exception:
+        duration = len(y) / sr
+    return fit_waveform(y, sr), None, digest, duration
+
+
+def start_decoder_pool(max_workers=None):
+    """Spawn-based pool for decode_file under the training CPU budget"""
+    return ProcessPoolExecutor(
+        max_workers=max(1, max_workers or available_cores()),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_decoder
+    )
+
+
+_yamnet_lock = threading.Lock()
+
+
+def get_yamnet():
+    """Load YAMNet on first use, so processes that never embed don't pay for it"""
+    if 'yamnet' not in _shared:
+        with _yamnet_lock:
+            if 'yamnet' not in _shared:
+                _shared['yamnet'] = hub.load(YAMNET_URL)
+    return _shared['yamnet']
+
+
+def _init_embedder():
+    cpu_budget.apply_runtime('train')
+    get_yamnet()
+
+
+@tf.function(input_signature=[tf.TensorSpec(shape=[None, SAMPLE_RATE], dtype=tf.float32)])
+def _embed_stack(waveforms):
+    def embed_one(waveform):
+        _, embeddings, _ = get_yamnet()(waveform)
+        return tf.reduce_mean(embeddings, axis=0)
+    return tf.map_fn(embed_one, waveforms, fn_output_signature=tf.float32)
+
+
+def embed_batch(waveforms):
+    """Mean YAMNet embeddings of stacked one-second waveforms in one graph call"""
+    return _embed_stack(tf.convert_to_tensor(waveforms, dtype=tf.float32)).numpy()
+
+
+def embed_clip(audio_bytes):
+    """Decode, validate and embed one uploaded clip, in the embedder.
+
+    Returns (embedding, error); embedding is None when the clip is rejected.
+    """
+    try:
+        y, sr = librosa.load(io.BytesIO(audio_bytes), sr=SAMPLE_RATE, duration=1.5)
+    except Exception as e:
+        return None, f"Invalid audio: {str(e)}"
+    is_valid, validation_msg = validate_waveform(y, sr)
+    if not is_valid:
+        return None, validation_msg
+    return embed_batch(fit_waveform(y, sr)[np.newaxis])[0], None
+
+
+def start_embedder_pool():
+    """Single spawn-based process that keeps YAMNet loaded for import and ingest embedding"""
+    return ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_embedder
+    )